@@ -30,7 +30,18 @@ class TopologyViewsConfig(PluginConfig):
         "preselected_tags": [],
         "draw_default_layout": False,
         "hide_single_cable_logical_conns": False,
+        "topology_cache_timeout": 60 * 60,
+        "layout_node_threshold": 500,
+        "server_timing": False,
+        "layer_workers": 1,
+        "adjacency_table": False,
+        "neighborhood_max_hops": 3,
+        "neighborhood_max_nodes": 1000,
     }
 
+    def ready(self):
+        super().ready()
+        from netbox_topology_views import signals
+
 
 config = TopologyViewsConfig
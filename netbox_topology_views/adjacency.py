@@ -0,0 +1,157 @@
+from typing import Callable, Dict, Iterable, List
+
+from dcim.models import Cable, Interface
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from wireless.models import WirelessLink
+
+from netbox_topology_views.models import TopologyEdge
+from netbox_topology_views.topology import (
+    get_cable_pairs,
+    get_path_destinations,
+    get_termination_names,
+)
+
+
+def get_cable_edges(cable_ids: Iterable[int]) -> List[TopologyEdge]:
+    """Edges of every pair of device terminations of the given cables"""
+    cable_ids = set(cable_ids)
+    cable_pairs = get_cable_pairs(
+        Q(
+            cable_id__in=cable_ids,
+            _device__isnull=False,
+            cable__terminations___device__isnull=False,
+        )
+    )
+    termination_names = get_termination_names(
+        ref
+        for _, _, a_type, a_id, _, b_type, b_id, _ in cable_pairs
+        for ref in ((a_type, a_id), (b_type, b_id))
+    )
+    colors = dict(Cable.objects.filter(pk__in=cable_ids).values_list("pk", "color"))
+
+    return [
+        TopologyEdge(
+            kind=TopologyEdge.KIND_CABLE,
+            object_id=cable_id,
+            from_device_id=a_device_id,
+            from_termination_type_id=a_type,
+            from_termination_id=a_id,
+            from_name=termination_names.get((a_type, a_id)) or "",
+            from_cable_id=cable_id,
+            to_device_id=b_device_id,
+            to_termination_type_id=b_type,
+            to_termination_id=b_id,
+            to_name=termination_names.get((b_type, b_id)) or "",
+            to_cable_id=cable_id,
+            color=colors.get(cable_id, ""),
+        )
+        for cable_id, _, a_type, a_id, a_device_id, b_type, b_id, b_device_id in cable_pairs
+    ]
+
+
+def get_wireless_edges(wireless_link_ids: Iterable[int]) -> List[TopologyEdge]:
+    interface_type = ContentType.objects.get_for_model(Interface)
+    wlan_links = WirelessLink.objects.filter(
+        pk__in=set(wireless_link_ids),
+        _interface_a_device__isnull=False,
+        _interface_b_device__isnull=False,
+    ).values_list(
+        "pk",
+        "_interface_a_device_id",
+        "interface_a_id",
+        "interface_a__name",
+        "_interface_b_device_id",
+        "interface_b_id",
+        "interface_b__name",
+    )
+    return [
+        TopologyEdge(
+            kind=TopologyEdge.KIND_WIRELESS,
+            object_id=pk,
+            from_device_id=a_device_id,
+            from_termination_type=interface_type,
+            from_termination_id=a_id,
+            from_name=a_name,
+            to_device_id=b_device_id,
+            to_termination_type=interface_type,
+            to_termination_id=b_id,
+            to_name=b_name,
+        )
+        for pk, a_device_id, a_id, a_name, b_device_id, b_id, b_name in wlan_links
+    ]
+
+
+def get_interface_edges(interface_ids: Iterable[int]) -> List[TopologyEdge]:
+    """Edges from interfaces to the interfaces at the end of their complete path"""
+    interfaces: List[Interface] = list(
+        Interface.objects.filter(
+            pk__in=set(interface_ids), _path__is_complete=True
+        ).select_related("_path")
+    )
+    interface_destinations, destinations = get_path_destinations(interfaces)
+    interface_type = ContentType.objects.get_for_model(Interface)
+
+    edges = []
+    for interface in interfaces:
+        for ref in interface_destinations.get(interface.pk, []):
+            destination = destinations.get(ref)
+            if not isinstance(destination, Interface):
+                continue
+            edges.append(
+                TopologyEdge(
+                    kind=TopologyEdge.KIND_INTERFACE,
+                    object_id=interface.pk,
+                    from_device_id=interface.device_id,
+                    from_termination_type=interface_type,
+                    from_termination_id=interface.pk,
+                    from_name=interface.name,
+                    from_cable_id=interface.cable_id,
+                    to_device_id=destination.device_id,
+                    to_termination_type_id=ref[0],
+                    to_termination_id=destination.pk,
+                    to_name=destination.name,
+                    to_cable_id=destination.cable_id,
+                )
+            )
+    return edges
+
+
+EDGE_LOADERS: Dict[str, Callable[[Iterable[int]], List[TopologyEdge]]] = {
+    TopologyEdge.KIND_CABLE: get_cable_edges,
+    TopologyEdge.KIND_WIRELESS: get_wireless_edges,
+    TopologyEdge.KIND_INTERFACE: get_interface_edges,
+}
+
+
+def update_topology_edges(kind: str, object_ids: Iterable[int]):
+    """Replace the edges of the given cables, wireless links or interfaces"""
+    object_ids = {object_id for object_id in object_ids if object_id is not None}
+    if not object_ids:
+        return
+
+    with transaction.atomic():
+        TopologyEdge.objects.filter(kind=kind, object_id__in=object_ids).delete()
+        TopologyEdge.objects.bulk_create(EDGE_LOADERS[kind](object_ids))
+
+
+def rebuild_topology_edges(batch_size: int = 1000) -> Dict[str, int]:
+    """Recreate the whole adjacency table, returns the amount of edges per kind"""
+    sources = {
+        TopologyEdge.KIND_CABLE: Cable.objects.all(),
+        TopologyEdge.KIND_WIRELESS: WirelessLink.objects.all(),
+        TopologyEdge.KIND_INTERFACE: Interface.objects.filter(_path__is_complete=True),
+    }
+
+    counts = {}
+    with transaction.atomic():
+        TopologyEdge.objects.all().delete()
+        for kind, queryset in sources.items():
+            object_ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+            counts[kind] = 0
+            for start in range(0, len(object_ids), batch_size):
+                edges = EDGE_LOADERS[kind](object_ids[start : start + batch_size])
+                TopologyEdge.objects.bulk_create(edges, batch_size=batch_size)
+                counts[kind] += len(edges)
+    return counts
@@ -1,7 +1,7 @@
 from dcim.models import Device, DeviceRole
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import CharField, ModelSerializer
 
-from netbox_topology_views.models import RoleImage
+from netbox_topology_views.models import RoleImage, SavedTopologyView
 
 
 class TopologyDummySerializer(ModelSerializer):
@@ -20,3 +20,11 @@ class DeviceRoleSerializer(ModelSerializer):
     class Meta:
         model = DeviceRole
         fields = ("name", "slug", "color", "vm_role", "description")
+
+
+class SavedTopologyViewSerializer(ModelSerializer):
+    page_url = CharField(source="get_absolute_url", read_only=True)
+
+    class Meta:
+        model = SavedTopologyView
+        fields = ("id", "name", "query", "page_url", "snapshot_built")
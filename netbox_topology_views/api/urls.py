@@ -4,7 +4,9 @@ from netbox_topology_views.api import views
 
 router = NetBoxRouter()
 
+router.register("topology", views.TopologyViewSet, basename="topology")
 router.register("save-coords", views.SaveCoordsViewSet)
 router.register("images", views.SaveRoleImageViewSet)
+router.register("saved-views", views.SavedTopologyViewViewSet)
 
 urlpatterns = router.urls
@@ -1,67 +1,363 @@
-from typing import Dict
+from collections import defaultdict
+from functools import partial
+from typing import DefaultDict, Dict, Optional, Tuple
 
-from circuits.models import Circuit
-from dcim.models import Device, DeviceRole, PowerFeed, PowerPanel
+from dcim.models import Device, DeviceRole
 from django.conf import settings
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.contenttypes.models import ContentType
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.viewsets import ReadOnlyModelViewSet, ViewSet
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet, ViewSet
 
 from netbox_topology_views.api.serializers import (
     RoleImageSerializer,
+    SavedTopologyViewSerializer,
     TopologyDummySerializer,
 )
-from netbox_topology_views.models import RoleImage
+from netbox_topology_views.caching import (
+    bump_topology_generation,
+    get_cached_nodes_details,
+    get_cached_topology,
+    get_cached_topology_data,
+    get_cached_topology_version,
+    get_topology_cache_key,
+    get_topology_etag,
+    get_topology_version,
+)
+from netbox_topology_views.clustering import (
+    CLUSTER_FIELDS,
+    get_clustered_topology_data,
+)
+from netbox_topology_views.compact import get_compact_topology_data
+from netbox_topology_views.delta import get_topology_delta
+from netbox_topology_views.filters import DeviceFilterSet
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.models import (
+    RoleImage,
+    SavedTopologyView,
+    save_coordinates,
+)
+from netbox_topology_views.neighborhood import get_neighborhood_topology_data
+from netbox_topology_views.topology import (
+    TopologyBuilder,
+    get_topology_data,
+    get_topology_flags,
+    iter_topology_json,
+    parse_node_id,
+)
 from netbox_topology_views.utils import get_image_from_url
 
 
+def query_option(query, name: str) -> bool:
+    return query.get(name, "").lower() == "true"
+
+
+class TopologyViewSet(ViewSet):
+    queryset = Device.objects.all()
+
+    def list(self, request):
+        """Topology nodes and edges of the devices matching the filters
+
+        with `stream=true` the payload is serialized incrementally into a
+        streaming response instead of being built in memory as a whole, with
+        `compact=true` the columnar payload of `create_compact_topology` is
+        returned and with `lazy_tooltips=true` the nodes come without their
+        tooltips, which are loaded from `tooltips` instead
+        """
+        timings = TopologyTimings()
+        flags = get_topology_flags(request.query_params)
+        etag = get_topology_etag(request.query_params, flags)
+        lazy_tooltips = query_option(request.query_params, "lazy_tooltips")
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif query_option(request.query_params, "stream") and not query_option(
+            request.query_params, "compact"
+        ):
+            response = StreamingHttpResponse(
+                self.stream_topology(request.query_params, flags, lazy_tooltips, timings),
+                content_type="application/json",
+            )
+        else:
+            topo_data = self.get_topology(request.query_params, flags, timings)
+            with timings.stage("encode"):
+                response = JsonResponse(topo_data, safe=False)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return timings.finish(response, "topology")
+
+    def get_topology(
+        self, query, flags, timings: TopologyTimings, hops: Optional[int] = None
+    ) -> Optional[Dict]:
+        lazy_tooltips = query_option(query, "lazy_tooltips")
+        layout = query.get("layout", "")
+        if query_option(query, "compact"):
+            build = partial(
+                get_compact_topology_data, lazy_tooltips=lazy_tooltips, layout=layout
+            )
+        else:
+            build = partial(get_topology_data, lazy_tooltips=lazy_tooltips, layout=layout)
+        if hops is not None:
+            build = partial(get_neighborhood_topology_data, hops=hops, build=build)
+
+        queryset = DeviceFilterSet(query, self.queryset).qs
+        return get_cached_topology_data(
+            query, queryset, flags, build=build, timings=timings
+        )
+
+    def stream_topology(self, query, flags, lazy_tooltips, timings: TopologyTimings):
+        with timings.stage("cache"):
+            topo_data = get_cached_topology(get_topology_cache_key(query, flags), timings)
+        if topo_data is not None:
+            return iter_topology_json(topo_data["nodes"], topo_data["edges"])
+
+        queryset = DeviceFilterSet(query, self.queryset).qs
+        builder = TopologyBuilder(
+            queryset,
+            **flags,
+            lazy_tooltips=lazy_tooltips,
+            timings=timings,
+            layout=query.get("layout", ""),
+        )
+        # run the queries before the response starts, only the node and
+        # edge dicts are created while streaming
+        if not builder.collect():
+            return iter(["null"])
+        return iter_topology_json(builder.iter_nodes(), builder.iter_edges())
+
+    @action(detail=False, methods=["get"])
+    def tooltips(self, request):
+        """Tooltip rows of the nodes given as `node_id` parameters"""
+        return JsonResponse(
+            get_cached_nodes_details(request.query_params.getlist("node_id"))
+        )
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """Changes of the topology since the version given as `since`
+
+        takes the parameters of `list` and the version from its ETag. Returns
+        the ids of the removed nodes and edges and a payload in the requested
+        format with the added and changed ones. If the earlier version is no
+        longer cached the whole topology is returned with `full` set.
+        """
+        timings = TopologyTimings()
+        flags = get_topology_flags(request.query_params)
+        version = get_topology_version(request.query_params, flags)
+        since = request.query_params.get("since", "")
+
+        if since == version:
+            changes = {
+                "version": version,
+                "full": False,
+                "removed": {"nodes": [], "edges": []},
+                "changed": None,
+            }
+        else:
+            topo_data = self.get_topology(request.query_params, flags, timings)
+            with timings.stage("cache"):
+                previous = get_cached_topology_version(since, version)
+
+            if previous is None or topo_data is None:
+                changes = {"version": version, "full": True, "topology": topo_data}
+            else:
+                with timings.stage("delta"):
+                    changes = {
+                        "version": version,
+                        "full": False,
+                        **get_topology_delta(previous, topo_data),
+                    }
+
+        with timings.stage("encode"):
+            response = JsonResponse(changes)
+        return timings.finish(response, "topology changes")
+
+    @action(detail=False, methods=["get"])
+    def neighborhood(self, request):
+        """Topology of the devices within `hops` connections of the filtered devices
+
+        takes the parameters of `list`, the filtered devices (usually selected
+        with `id`) are the start of a breadth first search over the cables,
+        logical connections and wireless links that are shown. The search is
+        limited to `neighborhood_max_hops` levels and `neighborhood_max_nodes`
+        devices
+        """
+        try:
+            hops = int(request.query_params.get("hops", 1))
+        except ValueError:
+            return JsonResponse({"status": "invalid hops"}, status=400)
+        max_hops = settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "neighborhood_max_hops"
+        ]
+        if not 0 <= hops <= max_hops:
+            return JsonResponse(
+                {"status": f"hops must be between 0 and {max_hops}"}, status=400
+            )
+
+        timings = TopologyTimings()
+        flags = get_topology_flags(request.query_params)
+        # cached apart from the topology of only the filtered devices
+        query = request.query_params.copy()
+        query["neighborhood"] = "true"
+        topo_data = self.get_topology(query, flags, timings, hops=hops)
+
+        with timings.stage("encode"):
+            response = JsonResponse(topo_data, safe=False)
+        return timings.finish(response, "topology neighborhood")
+
+    @action(detail=False, methods=["get"])
+    def clusters(self, request):
+        """Topology with the devices aggregated into clusters
+
+        takes the parameters of `list` plus `group_by`, one of site, location,
+        rack or role. Every cluster is a single node with edges counting the
+        connections to the other clusters, the clusters given as `expand`
+        parameters are drawn with their member nodes and edges instead
+        """
+        group_by = request.query_params.get("group_by")
+        if group_by not in CLUSTER_FIELDS:
+            return JsonResponse({"status": "invalid group_by"}, status=400)
+
+        timings = TopologyTimings()
+        flags = get_topology_flags(request.query_params)
+        queryset = DeviceFilterSet(request.query_params, self.queryset).qs
+        # cached apart from the unclustered topology of the same parameters
+        query = request.query_params.copy()
+        query["clusters"] = "true"
+        topo_data = get_cached_topology_data(
+            query,
+            queryset,
+            flags,
+            build=partial(
+                get_clustered_topology_data,
+                group_by=group_by,
+                expanded=set(request.query_params.getlist("expand")),
+                layout=request.query_params.get("layout", ""),
+            ),
+            timings=timings,
+        )
+
+        with timings.stage("encode"):
+            response = JsonResponse(topo_data, safe=False)
+        return timings.finish(response, "topology clusters")
+
+
+class SavedTopologyViewViewSet(ModelViewSet):
+    queryset = SavedTopologyView.objects.defer("snapshot")
+    serializer_class = SavedTopologyViewSerializer
+
+    def perform_update(self, serializer):
+        # the snapshot of another query is dropped, it is built again on the next run
+        if serializer.validated_data.get("query", serializer.instance.query) != (
+            serializer.instance.query
+        ):
+            serializer.save(snapshot=None, snapshot_built=None, snapshot_generation=None)
+        else:
+            serializer.save()
+
+    @action(detail=True, methods=["get"])
+    def snapshot(self, request, pk=None):
+        """Precomputed compact topology of a saved view
+
+        built by `build_topology_snapshots`, the build time is sent as the
+        `Last-Modified` header. Returns 404 until the first snapshot is built
+        """
+        saved_view = self.get_object()
+        if saved_view.snapshot_built is None:
+            return JsonResponse({"status": "no snapshot built yet"}, status=404)
+
+        response = JsonResponse(saved_view.snapshot, safe=False)
+        response["Last-Modified"] = http_date(saved_view.snapshot_built.timestamp())
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
 class SaveCoordsViewSet(ReadOnlyModelViewSet):
     queryset = Device.objects.none()
     serializer_class = TopologyDummySerializer
 
     @action(detail=False, methods=["patch"])
     def save_coords(self, request):
+        """Save the coordinates of a node
+
+        the layout is given as the `layout` query parameter, the default
+        layout has an empty name
+        """
         if not settings.PLUGINS_CONFIG["netbox_topology_views"][
             "allow_coordinates_saving"
         ]:
             return Response({"status": "not allowed to save coords"}, status=500)
 
-        device_id: str = request.data.get("node_id", None)
-        x_coord = request.data.get("x", None)
-        y_coord = request.data.get("y", None)
-
-        actual_device = None
-        if device_id.startswith("c"):
-            device_id = device_id.lstrip("c")
-            actual_device = Circuit.objects.get(id=device_id)
-        elif device_id.startswith("p"):
-            device_id = device_id.lstrip("p")
-            actual_device = PowerPanel.objects.get(id=device_id)
-        elif device_id.startswith("f"):
-            device_id = device_id.lstrip("f")
-            actual_device = PowerFeed.objects.get(id=device_id)
-        elif device_id.isnumeric():
-            actual_device = Device.objects.get(id=device_id)
-
-        if not actual_device:
+        parsed = parse_node_id(request.data.get("node_id", None))
+        if parsed is None or not parsed[0].objects.filter(pk=parsed[1]).exists():
             return Response({"status": "invalid node_id in body"}, status=400)
 
         try:
-            actual_device.custom_field_data["coordinates"] = "%s;%s" % (
-                x_coord,
-                y_coord,
-            )
-            actual_device.save()
-        except:
-            return Response(
-                {"status": "coords custom field could not be saved"}, status=500
-            )
+            x_coord = round(float(request.data.get("x", None)))
+            y_coord = round(float(request.data.get("y", None)))
+        except (TypeError, ValueError):
+            return Response({"status": "invalid coordinates in body"}, status=400)
+
+        save_coordinates(
+            {parsed: (x_coord, y_coord)}, request.query_params.get("layout", "")
+        )
+        bump_topology_generation()
 
         return Response({"status": "saved coords"})
 
+    @action(detail=False, methods=["patch"])
+    def save_coords_bulk(self, request):
+        """Save the coordinates of several nodes at once
+
+        takes a list of `{"node_id": ..., "x": ..., "y": ...}` and the layout
+        as the `layout` query parameter. The nodes are checked with one query
+        per node type and the coordinates written with a single bulk upsert
+        """
+        if not settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "allow_coordinates_saving"
+        ]:
+            return Response({"status": "not allowed to save coords"}, status=500)
+
+        if not isinstance(request.data, list):
+            return Response({"status": "expected a list of nodes in body"}, status=400)
+
+        coordinates: DefaultDict[type, Dict[int, Tuple[int, int]]] = defaultdict(dict)
+        for node in request.data:
+            if not isinstance(node, dict):
+                return Response({"status": "invalid node in body"}, status=400)
+
+            parsed = parse_node_id(node.get("node_id"))
+            if parsed is None:
+                return Response({"status": "invalid node_id in body"}, status=400)
+
+            try:
+                x_coord = round(float(node.get("x")))
+                y_coord = round(float(node.get("y")))
+            except (TypeError, ValueError):
+                return Response({"status": "invalid coordinates in body"}, status=400)
+
+            model, pk = parsed
+            coordinates[model][pk] = (x_coord, y_coord)
+
+        # coordinates of deleted nodes are left out
+        existing = {
+            (model, pk): node_coordinates[pk]
+            for model, node_coordinates in coordinates.items()
+            for pk in model.objects.filter(pk__in=node_coordinates.keys()).values_list(
+                "pk", flat=True
+            )
+        }
+        if existing:
+            save_coordinates(existing, request.query_params.get("layout", ""))
+            # cached topologies still hold the old coordinates
+            bump_topology_generation()
+
+        return Response({"status": "saved coords", "saved": len(existing)})
+
 
 class SaveRoleImageViewSet(PermissionRequiredMixin, ViewSet):
     queryset = DeviceRole.objects.none()
@@ -0,0 +1,160 @@
+import hashlib
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.http import QueryDict
+
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.topology import (
+    TOPOLOGY_FLAGS,
+    get_nodes_details,
+    get_topology_data,
+)
+
+TOPOLOGY_GENERATION_KEY = "netbox_topology_views.topology_generation"
+
+# query parameters that do not change the computed topology
+IGNORED_QUERY_PARAMS = ("draw_init", "since", "stream")
+
+TOPOLOGY_VERSION_PATTERN = re.compile(r"^\d+\.[0-9a-f]{64}$")
+
+
+def get_topology_generation() -> int:
+    """Get Topology Generation
+
+    the generation is bumped whenever an object that is drawn in a topology
+    changes, cached topologies of older generations are never read again
+    """
+    generation = cache.get(TOPOLOGY_GENERATION_KEY)
+    if generation is None:
+        # start from the current time so an evicted counter never
+        # returns to a generation that is still cached
+        cache.add(TOPOLOGY_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(TOPOLOGY_GENERATION_KEY)
+    return generation
+
+
+def bump_topology_generation():
+    try:
+        cache.incr(TOPOLOGY_GENERATION_KEY)
+    except ValueError:
+        cache.add(TOPOLOGY_GENERATION_KEY, time.time_ns(), None)
+
+
+def get_topology_version(query: QueryDict, flags: Dict[str, bool]) -> str:
+    """Get Topology Version
+
+    identifies the topology of a query at the current generation, the filter
+    part of the querystring is normalized (sorted keys and values, empty
+    values dropped) so equivalent urls share the same version
+    """
+    filters = []
+    for key, values in query.lists():
+        if key in TOPOLOGY_FLAGS or key in IGNORED_QUERY_PARAMS:
+            continue
+        values = sorted(value for value in values if value != "")
+        if values:
+            filters.append((key, values))
+    normalized = repr((sorted(filters), sorted(flags.items()))).encode()
+
+    return "{}.{}".format(
+        get_topology_generation(), hashlib.sha256(normalized).hexdigest()
+    )
+
+
+def get_topology_cache_key(query: QueryDict, flags: Dict[str, bool]) -> str:
+    return f"netbox_topology_views.topology.{get_topology_version(query, flags)}"
+
+
+def get_cached_topology_version(version: str, current_version: str) -> Optional[Dict]:
+    """Get the cached topology of an earlier version of the same query
+
+    returns None if the version is malformed, belongs to another query or is
+    no longer cached
+    """
+    if not get_topology_cache_timeout() or not TOPOLOGY_VERSION_PATTERN.match(version):
+        return None
+    if version.split(".")[1] != current_version.split(".")[1]:
+        return None
+    return cache.get(f"netbox_topology_views.topology.{version}")
+
+
+def get_topology_etag(query: QueryDict, flags: Dict[str, bool]) -> str:
+    return f'"{get_topology_version(query, flags)}"'
+
+
+def get_topology_cache_timeout() -> int:
+    return settings.PLUGINS_CONFIG["netbox_topology_views"]["topology_cache_timeout"]
+
+
+def get_cached_topology(cache_key: str, timings: TopologyTimings) -> Optional[Dict]:
+    """Get the cached topology of a cache key
+
+    the hit or miss is reported with the timings
+    """
+    if not get_topology_cache_timeout():
+        return None
+
+    topo_data = cache.get(cache_key)
+    timings.cache = "miss" if topo_data is None else "hit"
+    return topo_data
+
+
+def set_cached_topology(cache_key: str, topo_data: Dict):
+    if timeout := get_topology_cache_timeout():
+        cache.set(cache_key, topo_data, timeout)
+
+
+def get_cached_topology_data(
+    query: QueryDict,
+    queryset: QuerySet,
+    flags: Dict[str, bool],
+    build: Callable[..., Optional[Dict]] = get_topology_data,
+    timings: Optional[TopologyTimings] = None,
+) -> Optional[Dict]:
+    """Get the topology of a query from the cache or build it with `build`
+
+    the cache key is taken before the build, a topology built while the
+    generation is bumped is stored under the old generation and never read
+    """
+    if timings is None:
+        timings = TopologyTimings()
+
+    with timings.stage("cache"):
+        cache_key = get_topology_cache_key(query, flags)
+        topo_data = get_cached_topology(cache_key, timings)
+    if topo_data is not None:
+        return topo_data
+
+    topo_data = build(queryset, **flags, timings=timings)
+    if topo_data is not None:
+        with timings.stage("cache"):
+            set_cached_topology(cache_key, topo_data)
+    return topo_data
+
+
+def get_cached_nodes_details(node_ids: Iterable) -> Dict[str, List]:
+    """Get the tooltip rows of nodes, loading only the ones not in the cache"""
+    generation = get_topology_generation()
+    keys = {
+        f"netbox_topology_views.node_details.{generation}.{node_id}": str(node_id)
+        for node_id in node_ids
+    }
+
+    cached = cache.get_many(keys.keys()) if get_topology_cache_timeout() else {}
+    details = {keys[key]: value for key, value in cached.items()}
+
+    missing = [node_id for key, node_id in keys.items() if key not in cached]
+    if missing:
+        loaded = get_nodes_details(missing)
+        details.update(loaded)
+        if timeout := get_topology_cache_timeout():
+            cache.set_many(
+                {key: loaded[node_id] for key, node_id in keys.items() if node_id in loaded},
+                timeout,
+            )
+    return details
@@ -0,0 +1,170 @@
+import math
+from collections import Counter, defaultdict
+from typing import DefaultDict, Dict, List, Optional, Set, Union
+
+from circuits.models import Circuit
+from dcim.models import Device, DeviceRole, Location, PowerFeed, PowerPanel, Rack, Site
+from django.db.models import QuerySet
+
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.topology import (
+    TopologyBuilder,
+    create_edge,
+    create_node,
+    get_node_id,
+)
+
+# the device field and model of every way to cluster the devices, the field
+# is also the DeviceFilterSet filter selecting the members of a cluster
+CLUSTER_FIELDS = {
+    "site": ("site_id", Site),
+    "location": ("location_id", Location),
+    "rack": ("rack_id", Rack),
+    "role": ("device_role_id", DeviceRole),
+}
+
+# clusters of the nodes which are not devices
+OTHER_CLUSTERS = {"circuits": "Circuits", "power": "Power"}
+
+
+def get_cluster_id(
+    entity: Union[Device, Circuit, PowerPanel, PowerFeed], group_by: str
+) -> str:
+    if isinstance(entity, Circuit):
+        return "circuits"
+    if isinstance(entity, (PowerPanel, PowerFeed)):
+        return "power"
+    cluster_pk = getattr(entity, CLUSTER_FIELDS[group_by][0])
+    return f"{group_by}:{cluster_pk or 'none'}"
+
+
+def create_cluster_node(
+    cluster_id: str, group_by: str, objects: Dict, size: int
+) -> Dict:
+    if cluster_id in OTHER_CLUSTERS:
+        name, href = OTHER_CLUSTERS[cluster_id], None
+    else:
+        _, pk = cluster_id.split(":")
+        obj = objects.get(int(pk)) if pk != "none" else None
+        name = obj.name if obj is not None else f"No {group_by}"
+        href = obj.get_absolute_url() if obj is not None else None
+
+    node = {
+        "id": cluster_id,
+        "cluster": True,
+        "label": f"{name}\n{size} nodes",
+        "shape": "box",
+        "value": size,
+        "title": f"{name}<br>{size} nodes<br>Double click to expand",
+    }
+    if href is not None:
+        node["href"] = href
+    return node
+
+
+def create_clustered_topology(
+    builder: TopologyBuilder, group_by: str, expanded: Set[str]
+) -> Dict:
+    """Aggregate a collected topology into clusters
+
+    the devices are grouped by the `group_by` field of CLUSTER_FIELDS,
+    circuits and power nodes into a cluster each. Clusters in `expanded` are
+    drawn as their member nodes, the others as a single node. Edges between
+    collapsed clusters (or a member and a collapsed cluster) are merged into
+    one edge labelled with the amount of connections, edges within a
+    collapsed cluster are left out.
+    """
+    node_clusters: Dict = {}
+    members: DefaultDict[str, List] = defaultdict(list)
+    for entity in builder.node_entities:
+        cluster_id = get_cluster_id(entity, group_by)
+        node_clusters[get_node_id(entity)] = cluster_id
+        members[cluster_id].append(entity)
+
+    objects = CLUSTER_FIELDS[group_by][1].objects.in_bulk(
+        int(cluster_id.split(":")[1])
+        for cluster_id in members
+        if ":" in cluster_id and not cluster_id.endswith(":none")
+    )
+
+    nodes = []
+    for cluster_id, entities in members.items():
+        if cluster_id in expanded:
+            nodes.extend(
+                create_node(
+                    entity,
+                    builder.save_coords,
+                    builder.role_image_urls,
+                    True,
+                    saved=builder.coordinates.get(get_node_id(entity)),
+                )
+                for entity in entities
+            )
+        else:
+            nodes.append(create_cluster_node(cluster_id, group_by, objects, len(entities)))
+
+    def endpoint(node_id) -> Optional[Union[int, str]]:
+        cluster_id = node_clusters.get(node_id)
+        if cluster_id is None:
+            return None
+        return node_id if cluster_id in expanded else cluster_id
+
+    edges = []
+    cluster_edges: Counter = Counter()
+    for edge_id, spec in zip(builder.get_edge_ids(), builder.edge_specs):
+        node_a = spec["termination_a"]["device_id"]
+        node_b = spec["termination_b"]["device_id"]
+        end_a, end_b = endpoint(node_a), endpoint(node_b)
+        if end_a is None or end_b is None or end_a == end_b:
+            continue
+        if (end_a, end_b) == (node_a, node_b):
+            edges.append(create_edge(edge_id=edge_id, **spec))
+        else:
+            cluster_edges[tuple(sorted((end_a, end_b), key=str))] += 1
+
+    for (end_a, end_b), count in cluster_edges.items():
+        edges.append(
+            {
+                "id": f"{end_a}~{end_b}",
+                "from": end_a,
+                "to": end_b,
+                "label": str(count),
+                "title": f"{count} connections",
+                "width": min(10, 2 + math.log2(count)),
+            }
+        )
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def get_clustered_topology_data(
+    queryset: QuerySet,
+    hide_unconnected: bool,
+    save_coords: bool,
+    show_cables: bool,
+    show_circuit: bool,
+    show_logical_connections: bool,
+    show_power: bool,
+    show_wireless: bool,
+    group_by: str = "site",
+    expanded: Optional[Set[str]] = None,
+    timings: Optional[TopologyTimings] = None,
+    layout: str = "",
+) -> Optional[Dict]:
+    builder = TopologyBuilder(
+        queryset,
+        hide_unconnected,
+        save_coords,
+        show_cables,
+        show_circuit,
+        show_logical_connections,
+        show_power,
+        show_wireless,
+        lazy_tooltips=True,
+        timings=timings,
+        layout=layout,
+    )
+    if not builder.collect():
+        return None
+    with builder.timings.stage("render"):
+        return create_clustered_topology(builder, group_by, expanded or set())
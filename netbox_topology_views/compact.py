@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional
+
+from dcim.models import Device
+from django.db.models import QuerySet
+
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.topology import (
+    TopologyBuilder,
+    get_edge_names,
+    get_image_for_entity,
+    get_node_coordinates,
+    get_node_details,
+    get_node_id,
+    get_node_name,
+)
+
+# style presets of the edge kinds, mirroring create_edge. `{label}` in the
+# title is replaced with the label of the edge (the provider of a circuit)
+EDGE_STYLES = (
+    ("cable", {"title": "Cable"}),
+    (
+        "circuit",
+        {"title": "Circuit provider: {label}<br>Termination", "dashes": True},
+    ),
+    ("wireless", {"title": "Wireless Connection", "dashes": [2, 10, 2, 10]}),
+    ("power", {"title": "Power Connection", "dashes": [5, 5, 3, 3]}),
+    (
+        "interface",
+        {
+            "title": "Interface Connection",
+            "width": 3,
+            "dashes": [1, 10, 1, 10],
+            "arrows": {
+                "to": {"enabled": True, "scaleFactor": 0.5},
+                "from": {"enabled": True, "scaleFactor": 0.5},
+            },
+            "color": "#f1c232",
+        },
+    ),
+)
+EDGE_STYLE_IDS = {kind: style_id for style_id, (kind, _) in enumerate(EDGE_STYLES)}
+
+
+def get_edge_kind(edge_spec: Dict) -> str:
+    for kind in ("circuit", "wireless", "power", "interface"):
+        if edge_spec.get(kind) is not None:
+            return kind
+    return "cable"
+
+
+class Lookup:
+    """Assigns small integer ids to repeated values"""
+
+    def __init__(self):
+        self.values: List = []
+        self.ids: Dict = {}
+
+    def __getitem__(self, value) -> int:
+        if value not in self.ids:
+            self.ids[value] = len(self.values)
+            self.values.append(value)
+        return self.ids[value]
+
+
+def create_compact_topology(builder: TopologyBuilder) -> Dict:
+    """Create the compact payload of a collected topology
+
+    node and edge attributes are sent as parallel arrays, images, tooltip
+    labels and edge styles are referenced by index and tooltips are built
+    from the raw fields in the browser. Edge device names are left out
+    (null) when they equal the label of the node the edge connects to. With
+    lazy tooltips the `details` column is left out.
+    """
+    images = Lookup()
+    labels = Lookup()
+    nodes = {
+        key: []
+        for key in ("id", "label", "image", "href", "border", "x", "y", "physics", "details")
+    }
+    node_labels = {}
+
+    for entity in builder.node_entities:
+        node_id = get_node_id(entity)
+        name = get_node_name(entity)
+        x, y, physics = get_node_coordinates(
+            builder.coordinates.get(node_id),
+            builder.save_coords,
+            builder.positions.get(node_id),
+        )
+        border = None
+        if isinstance(entity, Device) and entity.device_role.color != "":
+            border = "#" + entity.device_role.color
+
+        details = []
+        if not builder.lazy_tooltips:
+            for label, value in get_node_details(entity):
+                details += [labels[label], value]
+
+        nodes["id"].append(node_id)
+        nodes["label"].append(name)
+        nodes["image"].append(
+            images[get_image_for_entity(entity, builder.role_image_urls)]
+        )
+        nodes["href"].append(entity.get_absolute_url())
+        nodes["border"].append(border)
+        nodes["x"].append(x)
+        nodes["y"].append(y)
+        nodes["physics"].append(physics)
+        nodes["details"].append(details)
+        node_labels[node_id] = name
+
+    if builder.lazy_tooltips:
+        del nodes["details"]
+
+    edges = {
+        key: []
+        for key in (
+            "id",
+            "from",
+            "to",
+            "style",
+            "label",
+            "a_name",
+            "a_device",
+            "b_name",
+            "b_device",
+            "href",
+            "color",
+        )
+    }
+    for edge_id, spec in zip(builder.get_edge_ids(), builder.edge_specs):
+        termination_a = spec["termination_a"]
+        termination_b = spec["termination_b"]
+        a_name, a_device, b_name, b_device = get_edge_names(termination_a, termination_b)
+        kind = get_edge_kind(spec)
+        cable = spec.get("cable")
+
+        href = color = None
+        if kind == "interface":
+            href = spec["interface"].get_absolute_url() + "trace"
+        if cable is not None:
+            href = cable.get_absolute_url()
+            if hasattr(cable, "color") and cable.color != "":
+                color = "#" + cable.color
+
+        edges["id"].append(edge_id)
+        edges["from"].append(termination_a["device_id"])
+        edges["to"].append(termination_b["device_id"])
+        edges["style"].append(EDGE_STYLE_IDS[kind])
+        edges["label"].append(
+            spec["circuit"]["provider_name"] if kind == "circuit" else None
+        )
+        edges["a_name"].append(a_name)
+        edges["a_device"].append(
+            None if node_labels.get(termination_a["device_id"]) == a_device else a_device
+        )
+        edges["b_name"].append(b_name)
+        edges["b_device"].append(
+            None if node_labels.get(termination_b["device_id"]) == b_device else b_device
+        )
+        edges["href"].append(href)
+        edges["color"].append(color)
+
+    return {
+        "format": "compact",
+        "images": images.values,
+        "labels": labels.values,
+        "edge_styles": [style for _, style in EDGE_STYLES],
+        "nodes": nodes,
+        "edges": edges,
+    }
+
+
+def get_compact_topology_data(
+    queryset: QuerySet,
+    hide_unconnected: bool,
+    save_coords: bool,
+    show_cables: bool,
+    show_circuit: bool,
+    show_logical_connections: bool,
+    show_power: bool,
+    show_wireless: bool,
+    lazy_tooltips: bool = False,
+    timings: Optional[TopologyTimings] = None,
+    layout: str = "",
+) -> Optional[Dict]:
+    builder = TopologyBuilder(
+        queryset,
+        hide_unconnected,
+        save_coords,
+        show_cables,
+        show_circuit,
+        show_logical_connections,
+        show_power,
+        show_wireless,
+        lazy_tooltips,
+        timings,
+        layout,
+    )
+    if not builder.collect():
+        return None
+    with builder.timings.stage("render"):
+        return create_compact_topology(builder)
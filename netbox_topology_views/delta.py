@@ -0,0 +1,87 @@
+import json
+from typing import Dict, List, Tuple
+
+# (position in the payload, serialized content) of a node or edge, by id
+PayloadItems = Dict[object, Tuple[int, str]]
+
+
+def get_compact_rows(topo_data: Dict, key: str) -> List[Dict]:
+    """Get the rows of a compact payload with the lookup indexes resolved
+
+    so rows of two versions compare equal when they draw the same item, even
+    if the images or labels were numbered differently
+    """
+    columns = topo_data[key]
+    rows = [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
+
+    if key == "nodes":
+        for row in rows:
+            row["image"] = topo_data["images"][row["image"]]
+            if "details" in row:
+                row["details"] = [
+                    topo_data["labels"][value] if i % 2 == 0 else value
+                    for i, value in enumerate(row["details"])
+                ]
+    else:
+        # the left out device names are the labels of the connected nodes
+        node_labels = dict(zip(topo_data["nodes"]["id"], topo_data["nodes"]["label"]))
+        for row in rows:
+            if row["a_device"] is None:
+                row["a_device"] = node_labels.get(row["from"])
+            if row["b_device"] is None:
+                row["b_device"] = node_labels.get(row["to"])
+    return rows
+
+
+def get_payload_items(topo_data: Dict, key: str) -> PayloadItems:
+    if topo_data.get("format") == "compact":
+        rows = get_compact_rows(topo_data, key)
+    else:
+        rows = topo_data[key]
+
+    return {
+        row["id"]: (position, json.dumps(row, sort_keys=True))
+        for position, row in enumerate(rows)
+    }
+
+
+def select_items(topo_data: Dict, positions: Dict[str, List[int]]) -> Dict:
+    """Get a payload of the same format with only the items at `positions`"""
+    if topo_data.get("format") != "compact":
+        return {
+            key: [topo_data[key][position] for position in key_positions]
+            for key, key_positions in positions.items()
+        }
+
+    selected = dict(topo_data)
+    for key, key_positions in positions.items():
+        selected[key] = {
+            name: [column[position] for position in key_positions]
+            for name, column in topo_data[key].items()
+        }
+    return selected
+
+
+def get_topology_delta(previous: Dict, current: Dict) -> Dict:
+    """Get the changes between two versions of a topology payload
+
+    both payloads have to be of the same format, nodes and edges are matched
+    by id. Returns the ids of the removed items and a payload of that format
+    with the added and changed items
+    """
+    removed = {}
+    positions = {}
+    for key in ("nodes", "edges"):
+        previous_items = get_payload_items(previous, key)
+        current_items = get_payload_items(current, key)
+
+        removed[key] = [
+            item_id for item_id in previous_items if item_id not in current_items
+        ]
+        positions[key] = [
+            position
+            for item_id, (position, content) in current_items.items()
+            if previous_items.get(item_id, (None, None))[1] != content
+        ]
+
+    return {"removed": removed, "changed": select_items(current, positions)}
@@ -34,11 +34,13 @@ class DeviceFilterForm(TenancyFilterForm, NetBoxModelFilterSetForm):
                 "filter_id",
                 "hide_unconnected",
                 "save_coords",
+                "layout",
                 "show_cables",
                 "show_circuit",
                 "show_logical_connections",
                 "show_power",
                 "show_wireless",
+                "group_by",
             ),
         ),
         (
@@ -122,11 +124,28 @@ class DeviceFilterForm(TenancyFilterForm, NetBoxModelFilterSetForm):
     show_power = forms.BooleanField(
         label=_("Show Power Feeds"), required=False, initial=False
     )
+    group_by = forms.ChoiceField(
+        label=_("Cluster By"),
+        required=False,
+        choices=(
+            ("", "---------"),
+            ("site", _("Site")),
+            ("location", _("Location")),
+            ("rack", _("Rack")),
+            ("role", _("Device Role")),
+        ),
+    )
     save_coords = forms.BooleanField(
         label=_("Save Coordinates"),
         required=False,
         disabled=(not allow_coordinates_saving),
     )
+    layout = forms.CharField(
+        label=_("Layout"),
+        required=False,
+        max_length=100,
+        help_text=_("Name of the saved coordinates to draw with, empty for the default"),
+    )
     status = MultipleChoiceField(
         choices=DeviceStatusChoices, required=False, label=_("Device Status")
     )
@@ -0,0 +1,126 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import connection
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
+logger = logging.getLogger("netbox_topology_views")
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram(
+        "netbox_topology_views_stage_seconds",
+        "Duration of the stages of a topology build",
+        ["stage"],
+    )
+    STAGE_QUERIES = Counter(
+        "netbox_topology_views_stage_queries",
+        "Database queries run by the stages of a topology build",
+        ["stage"],
+    )
+    CACHE_LOOKUPS = Counter(
+        "netbox_topology_views_cache_lookups",
+        "Lookups of topologies in the cache",
+        ["result"],
+    )
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it sees"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class TopologyTimings:
+    """Duration and query count of the stages of a topology request
+
+    stages entered several times are summed up. The results are sent as a
+    `Server-Timing` header, logged and, with NetBox metrics enabled, recorded
+    as Prometheus metrics. `cache` is the result of the cache lookup of the
+    topology, "hit" or "miss"
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.cache: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                yield
+        finally:
+            stage = self.stages.setdefault(name, {"duration": 0.0, "queries": 0})
+            stage["duration"] += time.perf_counter() - start
+            stage["queries"] += counter.count
+
+    def get_server_timing(self) -> str:
+        return ", ".join(
+            '{};dur={:.1f};desc="{} queries"'.format(
+                name, stage["duration"] * 1000, stage["queries"]
+            )
+            for name, stage in self.stages.items()
+        )
+
+    def finish(self, response, view: str):
+        """Add the timings to a response, log and record them
+
+        the content of a streaming response is generated after its headers
+        are sent, the `Server-Timing` header only covers the stages before.
+        The sending is timed as the "stream" stage and the timings are logged
+        and recorded once it ends
+        """
+        if settings.PLUGINS_CONFIG["netbox_topology_views"]["server_timing"]:
+            response["Server-Timing"] = self.get_server_timing()
+
+        if response.streaming:
+            response.streaming_content = self.iter_stream(response.streaming_content, view)
+        else:
+            self.record(view)
+        return response
+
+    def iter_stream(self, content: Iterable, view: str) -> Iterator:
+        try:
+            with self.stage("stream"):
+                yield from content
+        finally:
+            self.record(view)
+
+    def record(self, view: str):
+        """Log the timings and record them as Prometheus metrics"""
+        logger.info(
+            "%s: %s%s",
+            view,
+            ", ".join(
+                "{} {:.1f}ms".format(name, stage["duration"] * 1000)
+                for name, stage in self.stages.items()
+            ),
+            f", cache {self.cache}" if self.cache is not None else "",
+            extra={
+                "topology_view": view,
+                "topology_stages": self.stages,
+                "topology_counts": self.counts,
+                "topology_cache": self.cache,
+            },
+        )
+
+        if Histogram is not None and getattr(settings, "METRICS_ENABLED", False):
+            for name, stage in self.stages.items():
+                STAGE_SECONDS.labels(name).observe(stage["duration"])
+                STAGE_QUERIES.labels(name).inc(stage["queries"])
+            if self.cache is not None:
+                CACHE_LOOKUPS.labels(self.cache).inc()
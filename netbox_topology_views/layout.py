@@ -0,0 +1,48 @@
+import math
+from collections import defaultdict
+from typing import DefaultDict, Dict, Hashable, Iterable, List, Tuple
+
+LAYOUT_SPACING_X = 150
+LAYOUT_SPACING_Y = 200
+# nodes per line, wider tiers are wrapped onto several lines
+LAYOUT_LINE_WIDTH = 40
+
+
+def compute_layout(
+    nodes: Iterable[Tuple[Hashable, Tuple]], edges: Iterable[Tuple[Hashable, Hashable]]
+) -> Dict[Hashable, Tuple[int, int]]:
+    """Compute a layered layout
+
+    takes (node id, tier) pairs and (from, to) node id pairs. Every tier is
+    drawn below the previous one, ordered by the tier values. Within a tier the
+    nodes are sorted by the mean x of their neighbours in the tiers above, which
+    keeps connected nodes close and avoids most crossing edges. Runs in linear
+    time, so it can be used for topologies too large for the physics
+    simulation in the browser.
+    """
+    tiers: DefaultDict[Tuple, List[Hashable]] = defaultdict(list)
+    for node_id, tier in nodes:
+        tiers[tier].append(node_id)
+
+    neighbours: DefaultDict[Hashable, List[Hashable]] = defaultdict(list)
+    for node_a, node_b in edges:
+        neighbours[node_a].append(node_b)
+        neighbours[node_b].append(node_a)
+
+    positions: Dict[Hashable, Tuple[int, int]] = {}
+
+    def barycenter(node_id) -> float:
+        placed = [positions[n][0] for n in neighbours[node_id] if n in positions]
+        return sum(placed) / len(placed) if placed else math.inf
+
+    y = 0
+    for tier in sorted(tiers):
+        # nodes without placed neighbours keep their order at the end
+        node_ids = sorted(tiers[tier], key=barycenter)
+        for start in range(0, len(node_ids), LAYOUT_LINE_WIDTH):
+            line = node_ids[start : start + LAYOUT_LINE_WIDTH]
+            offset = (len(line) - 1) * LAYOUT_SPACING_X / 2
+            for i, node_id in enumerate(line):
+                positions[node_id] = (round(i * LAYOUT_SPACING_X - offset), y)
+            y += LAYOUT_SPACING_Y
+    return positions
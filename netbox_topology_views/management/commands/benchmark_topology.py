@@ -0,0 +1,523 @@
+import itertools
+import json
+import math
+import random
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from circuits.models import Circuit, CircuitTermination, CircuitType, Provider
+from dcim.models import (
+    Cable,
+    Device,
+    DeviceRole,
+    DeviceType,
+    FrontPort,
+    Interface,
+    Manufacturer,
+    PowerFeed,
+    PowerPanel,
+    PowerPort,
+    RearPort,
+    Site,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext, override_settings
+from wireless.models import WirelessLink
+
+from netbox_topology_views.topology import (
+    TopologyBuilder,
+    get_cable_ends,
+    get_topology_data,
+    resolve_terminations,
+)
+
+BENCHMARK_FLAGS = (
+    "show_cables",
+    "show_circuit",
+    "show_logical_connections",
+    "show_power",
+    "show_wireless",
+)
+
+# shares of --scaling-devices the scaling benchmark is run on
+SCALING_STEPS = (0.1, 0.25, 0.5, 1.0)
+
+# sizes of the selections the power layer passes are compared on
+POWER_SELECTIONS = (20, 200)
+
+# the signals of the fixtures bump the topology generation and the role image
+# urls of the test database are cached, neither may reach the configured cache
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "netbox_topology_views.benchmark",
+    }
+}
+
+
+def connect(termination_a, termination_b):
+    Cable(a_terminations=[termination_a], b_terminations=[termination_b]).save()
+
+
+def create_fixtures(
+    sites: int,
+    devices: int,
+    cables: int,
+    chains: int,
+    circuits: int,
+    power_feeds: int,
+    wireless_links: int,
+    seed: int,
+    prefix: str = "benchmark",
+):
+    """Create a synthetic DCIM, the counts apply to every site
+
+    the slugs of the created objects start with `prefix`, the sites with
+    `<prefix>-site-`
+    """
+    rng = random.Random(seed)
+    name = prefix.replace("-", " ").title()
+
+    manufacturer = Manufacturer.objects.create(name=name, slug=prefix)
+    device_type = DeviceType.objects.create(
+        manufacturer=manufacturer, model=f"{name} Device", slug=f"{prefix}-device"
+    )
+    panel_type = DeviceType.objects.create(
+        manufacturer=manufacturer, model=f"{name} Panel", slug=f"{prefix}-panel"
+    )
+    roles = [
+        DeviceRole.objects.create(
+            name=f"{name} Role {i}", slug=f"{prefix}-role-{i}", color="9e9e9e"
+        )
+        for i in range(4)
+    ]
+    panel_role = DeviceRole.objects.create(
+        name=f"{name} Panel", slug=f"{prefix}-panel", color="607d8b"
+    )
+    provider = Provider.objects.create(name=name, slug=prefix)
+    circuit_type = CircuitType.objects.create(name=name, slug=prefix)
+
+    for site_index in range(sites):
+        site = Site.objects.create(
+            name=f"{name} Site {site_index}", slug=f"{prefix}-site-{site_index}"
+        )
+        site_devices: List[Device] = Device.objects.bulk_create(
+            Device(
+                name=f"site{site_index}-device{i}",
+                site=site,
+                device_type=device_type,
+                device_role=roles[i % len(roles)],
+            )
+            for i in range(devices)
+        )
+
+        def create_interfaces(count: int, prefix: str, interface_type: str = "1000base-t"):
+            return Interface.objects.bulk_create(
+                Interface(
+                    device=rng.choice(site_devices), name=f"{prefix}{i}", type=interface_type
+                )
+                for i in range(count)
+            )
+
+        interfaces = create_interfaces(cables * 2, "cable")
+        for i in range(cables):
+            connect(interfaces[2 * i], interfaces[2 * i + 1])
+
+        # device - front port, rear port - rear port, front port - device
+        if chains:
+            panels = Device.objects.bulk_create(
+                Device(
+                    name=f"site{site_index}-panel{i}",
+                    site=site,
+                    device_type=panel_type,
+                    device_role=panel_role,
+                )
+                for i in range(2)
+            )
+            rear_ports = RearPort.objects.bulk_create(
+                RearPort(device=panel, name=f"rear{i}", type="8p8c", positions=1)
+                for panel in panels
+                for i in range(chains)
+            )
+            front_ports = FrontPort.objects.bulk_create(
+                FrontPort(
+                    device=rear_port.device,
+                    name=rear_port.name.replace("rear", "front"),
+                    type="8p8c",
+                    rear_port=rear_port,
+                    rear_port_position=1,
+                )
+                for rear_port in rear_ports
+            )
+            interfaces = create_interfaces(chains * 2, "chain")
+            for i in range(chains):
+                connect(interfaces[2 * i], front_ports[i])
+                connect(rear_ports[i], rear_ports[chains + i])
+                connect(front_ports[chains + i], interfaces[2 * i + 1])
+
+        interfaces = create_interfaces(circuits, "circuit")
+        for i in range(circuits):
+            circuit = Circuit.objects.create(
+                cid=f"site{site_index}-circuit{i}", provider=provider, type=circuit_type
+            )
+            termination = CircuitTermination(circuit=circuit, term_side="A", site=site)
+            termination.save()
+            connect(termination, interfaces[i])
+
+        if power_feeds:
+            power_panel = PowerPanel.objects.create(
+                site=site, name=f"site{site_index}-panel"
+            )
+        for i in range(power_feeds):
+            power_feed = PowerFeed.objects.create(power_panel=power_panel, name=f"feed{i}")
+            power_port = PowerPort.objects.create(
+                device=rng.choice(site_devices), name=f"power{i}"
+            )
+            connect(power_feed, power_port)
+
+        interfaces = create_interfaces(wireless_links * 2, "wireless", "ieee802.11ac")
+        for i in range(wireless_links):
+            WirelessLink(
+                interface_a=interfaces[2 * i],
+                interface_b=interfaces[2 * i + 1],
+                ssid=f"benchmark{i}",
+            ).save()
+
+
+def get_combination_name(flags: Dict[str, bool]) -> str:
+    enabled = [flag[len("show_"):] for flag, value in flags.items() if value]
+    return "+".join(enabled) or "none"
+
+
+def run_benchmark(queryset: QuerySet, flags: Dict[str, bool], repeat: int) -> Dict:
+    """Measure get_topology_data
+
+    the wall time is the best of `repeat` runs, the memory is traced in a
+    separate run as tracing slows down the build
+    """
+    wall_times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            topo_data = get_topology_data(
+                queryset.all(), hide_unconnected=False, save_coords=False, **flags
+            )
+            wall_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    get_topology_data(queryset.all(), hide_unconnected=False, save_coords=False, **flags)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_time": min(wall_times),
+        "queries": len(queries),
+        "peak_memory": peak_memory,
+        "payload_bytes": len(json.dumps(topo_data)),
+    }
+
+
+def load_site_power(builder: TopologyBuilder) -> Tuple[List[PowerFeed], Dict]:
+    """Load the power layer with `hide_unconnected` from the feeds at the sites
+
+    every feed of the panels at the sites of the devices is loaded and the
+    link peers of their cables are resolved, the way the power layer was
+    loaded before `TopologyBuilder.load_device_power`
+    """
+    power_feeds, _ = builder.load_site_power()
+    cable_ends = get_cable_ends(
+        pf.cable_id for pf in power_feeds if pf.cable_id is not None
+    )
+    peer_refs = {}
+    for power_feed in power_feeds:
+        ends = cable_ends.get(power_feed.cable_id, {})
+        peer_end = "B" if power_feed.cable_end == "A" else "A"
+        if peer_end in ends:
+            peer_refs[power_feed.pk] = ends[peer_end]
+    terminations = resolve_terminations(peer_refs.values())
+    return power_feeds, {pk: terminations.get(ref) for pk, ref in peer_refs.items()}
+
+
+# the ways of loading the power layer with `hide_unconnected` compared
+POWER_PASSES = {
+    "load_site_power": load_site_power,
+    "load_device_power": TopologyBuilder.load_device_power,
+}
+
+
+def run_power_pass(queryset: QuerySet, power_pass: str, repeat: int) -> Dict:
+    """Measure one way of loading the power layer of a topology
+
+    `power_pass` is a name of POWER_PASSES, the devices are loaded
+    beforehand and not measured
+    """
+    builder = TopologyBuilder(
+        queryset.all(),
+        hide_unconnected=True,
+        save_coords=False,
+        show_cables=False,
+        show_circuit=False,
+        show_logical_connections=False,
+        show_power=True,
+        show_wireless=False,
+    )
+    builder.load_devices()
+    load_power = partial(POWER_PASSES[power_pass], builder)
+
+    wall_times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            power_feeds, _ = load_power()
+            wall_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    load_power()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_time": min(wall_times),
+        "queries": len(queries),
+        "peak_memory": peak_memory,
+        "payload_bytes": 0,
+        "power_feeds": len(power_feeds),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the topology build against synthetic DCIM data in a test "
+        "database, for every combination of the show_* options"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sites", type=int, default=2)
+        parser.add_argument("--devices", type=int, default=200, help="Devices per site")
+        parser.add_argument("--cables", type=int, default=300, help="Cables per site")
+        parser.add_argument(
+            "--chains", type=int, default=20, help="Front/rear port chains per site"
+        )
+        parser.add_argument("--circuits", type=int, default=20, help="Circuits per site")
+        parser.add_argument(
+            "--power-feeds", type=int, default=20, help="Power feeds per site"
+        )
+        parser.add_argument(
+            "--wireless-links", type=int, default=20, help="Wireless links per site"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Runs per combination, the best is kept"
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the test database and its fixtures between benchmarks",
+        )
+        parser.add_argument(
+            "--save-baseline", type=Path, help="Write the results to this file"
+        )
+        parser.add_argument(
+            "--baseline", type=Path, help="Compare the results to this file"
+        )
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            help="Fail if a wall time is more than this percentage above the "
+            "baseline or a query count increased",
+        )
+        parser.add_argument(
+            "--scaling",
+            action="store_true",
+            help="Also build the topology with every layer for growing shares of "
+            "--scaling-devices devices and fail if the time or the queries per "
+            "device grow between the steps",
+        )
+        parser.add_argument(
+            "--scaling-devices",
+            type=int,
+            default=50000,
+            help="Devices of the largest scaling step, created in sites of the "
+            "size set by --devices, --cables and the other counts",
+        )
+        parser.add_argument(
+            "--scaling-tolerance",
+            type=float,
+            default=50,
+            help="Percentage the time per device may grow between two scaling "
+            "steps before the build counts as superlinear",
+        )
+        parser.add_argument(
+            "--compare-power",
+            action="store_true",
+            help="Also compare loading the power layer from the feeds at the "
+            "sites of the devices with loading it from the devices' power ports",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"] is not None:
+            baseline = json.loads(options["baseline"].read_text())
+
+        # the layers run in the main thread, CaptureQueriesContext only sees
+        # the queries of its own connection
+        plugins_config = {
+            **settings.PLUGINS_CONFIG,
+            "netbox_topology_views": {
+                **settings.PLUGINS_CONFIG["netbox_topology_views"],
+                "layer_workers": 1,
+            },
+        }
+
+        fixture_counts = (
+            options["devices"],
+            options["cables"],
+            options["chains"],
+            options["circuits"],
+            options["power_feeds"],
+            options["wireless_links"],
+            options["seed"],
+        )
+
+        superlinear: List[str] = []
+        with override_settings(CACHES=BENCHMARK_CACHES, PLUGINS_CONFIG=plugins_config):
+            old_name = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+            )
+            try:
+                if not Site.objects.filter(slug__startswith="benchmark-site-").exists():
+                    self.stdout.write("Creating fixtures...")
+                    create_fixtures(options["sites"], *fixture_counts)
+                queryset = Device.objects.filter(site__slug__startswith="benchmark-site-")
+
+                results = {}
+                for values in itertools.product(
+                    (False, True), repeat=len(BENCHMARK_FLAGS)
+                ):
+                    flags = dict(zip(BENCHMARK_FLAGS, values))
+                    results[get_combination_name(flags)] = run_benchmark(
+                        queryset, flags, options["repeat"]
+                    )
+
+                if options["scaling"]:
+                    scaling_results, superlinear = self.run_scaling(
+                        fixture_counts,
+                        options["scaling_devices"],
+                        options["scaling_tolerance"],
+                        options["repeat"],
+                    )
+                    results.update(scaling_results)
+
+                if options["compare_power"]:
+                    results.update(self.compare_power(queryset, options["repeat"]))
+            finally:
+                connection.creation.destroy_test_db(
+                    old_name, verbosity=0, keepdb=options["keepdb"]
+                )
+                cache.clear()
+
+        regressions = self.report(results, baseline, options["max_regression"])
+
+        if options["save_baseline"] is not None:
+            options["save_baseline"].write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+
+        if regressions:
+            raise CommandError("Regressions against the baseline: " + ", ".join(regressions))
+        if superlinear:
+            raise CommandError("Superlinear scaling: " + ", ".join(superlinear))
+
+    def run_scaling(
+        self, fixture_counts: Tuple, devices: int, tolerance: float, repeat: int
+    ) -> Tuple[Dict[str, Dict], List[str]]:
+        """Build the topology for growing shares of `devices` devices
+
+        the devices are created in their own sites of the benchmark size.
+        Returns the results and the steps whose time per device grew more
+        than `tolerance` percent over the previous step or whose queries per
+        device grew at all
+        """
+        queryset = Device.objects.filter(site__slug__startswith="benchmark-scaling-site-")
+        if not queryset.exists():
+            sites = math.ceil(devices / fixture_counts[0])
+            self.stdout.write(f"Creating {sites} sites of scaling fixtures...")
+            create_fixtures(sites, *fixture_counts, prefix="benchmark-scaling")
+
+        device_ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+        flags = dict.fromkeys(BENCHMARK_FLAGS, True)
+
+        results = {}
+        superlinear = []
+        previous = None
+        for step in SCALING_STEPS:
+            count = max(1, round(min(devices, len(device_ids)) * step))
+            result = run_benchmark(
+                queryset.filter(pk__lte=device_ids[count - 1]), flags, repeat
+            )
+            name = f"scaling {count} devices"
+            results[name] = result
+
+            time_per_device = result["wall_time"] / count
+            queries_per_device = result["queries"] / count
+            line = f"{count} devices: {time_per_device * 1e6:.1f} us per device"
+            if previous is not None and (
+                time_per_device > previous[0] * (1 + tolerance / 100)
+                or queries_per_device > previous[1]
+            ):
+                superlinear.append(name)
+                line = self.style.ERROR(line + ", superlinear")
+            self.stdout.write(line)
+            previous = (time_per_device, queries_per_device)
+        return results, superlinear
+
+    def compare_power(self, queryset: QuerySet, repeat: int) -> Dict[str, Dict]:
+        device_ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+
+        results = {}
+        for count in POWER_SELECTIONS:
+            selection = queryset.filter(pk__in=device_ids[:count])
+            for power_pass in POWER_PASSES:
+                result = run_power_pass(selection, power_pass, repeat)
+                results[f"power {power_pass} {count} devices"] = result
+
+                self.stdout.write(
+                    f"{power_pass} for {count} devices: "
+                    f"{result['wall_time'] * 1000:.1f} ms, {result['queries']} queries, "
+                    f"{result['power_feeds']} power feeds loaded"
+                )
+        return results
+
+    def report(
+        self, results: Dict, baseline: Optional[Dict], max_regression: Optional[float]
+    ) -> List[str]:
+        """Print the results, returns the combinations that regressed"""
+        regressions = []
+        self.stdout.write(
+            f"{'combination':<50} {'wall ms':>9} {'queries':>8} "
+            f"{'peak KiB':>9} {'payload KiB':>12} {'vs baseline':>12}"
+        )
+        for name, result in results.items():
+            line = (
+                f"{name:<50} {result['wall_time'] * 1000:>9.1f} {result['queries']:>8} "
+                f"{result['peak_memory'] / 1024:>9.0f} {result['payload_bytes'] / 1024:>12.1f}"
+            )
+
+            previous = (baseline or {}).get(name)
+            if previous is not None:
+                change = (result["wall_time"] / previous["wall_time"] - 1) * 100
+                line += f" {change:>+11.1f}%"
+                if max_regression is not None and (
+                    change > max_regression or result["queries"] > previous["queries"]
+                ):
+                    regressions.append(name)
+                    line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return regressions
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from netbox_topology_views.models import SavedTopologyView
+from netbox_topology_views.snapshots import build_snapshots, get_stale_saved_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the snapshots of saved topology views which are missing or "
+        "outdated, in a pool of worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names", nargs="*", help="Saved views to build, all when left out"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Worker processes, defaults to the amount of CPUs",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild the snapshots even if they are current",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            saved_views = SavedTopologyView.objects.all()
+            if options["names"]:
+                saved_views = saved_views.filter(name__in=options["names"])
+            pks = list(saved_views.values_list("pk", flat=True))
+        else:
+            pks = get_stale_saved_views(options["names"])
+
+        for name, nodes, seconds in build_snapshots(pks, options["workers"]):
+            self.stdout.write(f"{name}: {nodes} nodes in {seconds:.1f}s")
+        self.stdout.write(self.style.SUCCESS(f"Built {len(pks)} snapshots"))
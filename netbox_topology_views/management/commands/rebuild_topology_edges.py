@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from netbox_topology_views.adjacency import rebuild_topology_edges
+from netbox_topology_views.caching import bump_topology_generation
+
+
+class Command(BaseCommand):
+    help = "Recreate the precomputed topology edges of the adjacency table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Cables, wireless links or interfaces handled per query",
+        )
+
+    def handle(self, *args, **options):
+        counts = rebuild_topology_edges(options["batch_size"])
+        bump_topology_generation()
+
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count} edges")
+        self.stdout.write(self.style.SUCCESS("Rebuilt the topology edges"))
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dcim', '0160_populate_cable_ends'),
+        ('netbox_topology_views', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopologyEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=16)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('from_termination_id', models.PositiveBigIntegerField()),
+                ('from_name', models.CharField(blank=True, max_length=255)),
+                ('from_cable_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('to_termination_id', models.PositiveBigIntegerField()),
+                ('to_name', models.CharField(blank=True, max_length=255)),
+                ('to_cable_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('color', models.CharField(blank=True, max_length=6)),
+                ('from_device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dcim.device')),
+                ('from_termination_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('to_device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dcim.device')),
+                ('to_termination_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='topologyedge',
+            index=models.Index(fields=['kind', 'object_id'], name='netbox_topo_kind_4fed9a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topologyedge',
+            index=models.Index(fields=['kind', 'from_device', 'to_device'], name='netbox_topo_kind_505ff3_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.1.7 on 2026-10-17 14:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# models whose "coordinates" custom field held the saved positions
+NODE_MODELS = (
+    ("dcim", "Device"),
+    ("circuits", "Circuit"),
+    ("dcim", "PowerPanel"),
+    ("dcim", "PowerFeed"),
+)
+
+
+def copy_coordinates(apps, schema_editor):
+    """Copy the "x;y" coordinates custom field into the default layout"""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    NodeCoordinate = apps.get_model("netbox_topology_views", "NodeCoordinate")
+
+    for app_label, model_name in NODE_MODELS:
+        model = apps.get_model(app_label, model_name)
+        content_type, _ = ContentType.objects.get_or_create(
+            app_label=app_label, model=model_name.lower()
+        )
+
+        coordinates = []
+        for pk, custom_field_data in (
+            model.objects.filter(custom_field_data__has_key="coordinates")
+            .values_list("pk", "custom_field_data")
+            .iterator()
+        ):
+            x, _, y = (custom_field_data["coordinates"] or "").partition(";")
+            try:
+                x, y = round(float(x)), round(float(y))
+            except ValueError:
+                continue
+            coordinates.append(
+                NodeCoordinate(
+                    content_type=content_type, object_id=pk, layout="", x=x, y=y
+                )
+            )
+        NodeCoordinate.objects.bulk_create(coordinates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circuits', '0038_cabling_cleanup'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dcim', '0160_populate_cable_ends'),
+        ('netbox_topology_views', '0002_topologyedge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeCoordinate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('layout', models.CharField(blank=True, max_length=100)),
+                ('x', models.IntegerField()),
+                ('y', models.IntegerField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='nodecoordinate',
+            constraint=models.UniqueConstraint(fields=('layout', 'content_type', 'object_id'), name='netbox_topology_views_nodecoordinate_unique'),
+        ),
+        migrations.RunPython(copy_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_topology_views', '0003_nodecoordinate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedTopologyView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('query', models.TextField(blank=True)),
+                ('snapshot', models.JSONField(blank=True, editable=False, null=True)),
+                ('snapshot_built', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('snapshot_generation', models.BigIntegerField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'ordering': ('name',),
+            },
+        ),
+    ]
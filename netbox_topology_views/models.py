@@ -1,11 +1,16 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import DefaultDict, Dict, Iterable, Optional, Set, Tuple, Type
 
 from dcim.models import DeviceRole
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Q
 from django.templatetags.static import static
+from django.urls import reverse
 from netbox.models.features import (
     ChangeLoggingMixin,
     ExportTemplatesMixin,
@@ -17,6 +22,7 @@ from netbox_topology_views.utils import (
     IMAGE_DIR,
     Role,
     find_image_url,
+    get_image_index,
     get_model_role,
     image_static_url,
 )
@@ -55,6 +61,11 @@ class RoleImage(ChangeLoggingMixin, ExportTemplatesMixin, WebhooksMixin):
         self.__role = get_model_role(model_class)
         return self.__role
 
+    @role.setter
+    def role(self, role: Role):
+        """Set the role when it is already known, saving its query"""
+        self.__role = role
+
     def __str__(self):
         return f"{self.role} - {self.image}"
 
@@ -86,8 +97,206 @@ class RoleImage(ChangeLoggingMixin, ExportTemplatesMixin, WebhooksMixin):
         return image_static_url(IMAGE_DIR / "role-unknown.png")
 
     def get_image_url(self, dir: Path = CONF_IMAGE_DIR) -> str:
-        try:
-            self.get_image()
-        except ValueError:
+        path = Path(settings.STATIC_ROOT) / self.image
+        if not get_image_index(path.parent).has_file(path.name):
             return self.get_default_image(dir)
         return static(f"/{self.image}")
+
+
+ROLE_IMAGE_URLS_CACHE_KEY = "netbox_topology_views.role_image_urls"
+
+
+@dataclass
+class RoleImageUrls:
+    """Image urls of all role images
+
+    device role images are keyed by device role id, the images of the
+    additional roles (circuits, power panels, ...) by content type id
+    """
+
+    device_roles: Dict[int, str] = field(default_factory=dict)
+    content_types: Dict[int, str] = field(default_factory=dict)
+
+
+def get_role_image_urls() -> RoleImageUrls:
+    """Get Role Image Urls
+
+    loads all role images in one query, the result is kept in the cache until
+    a role image is saved or deleted
+    """
+    role_image_urls: Optional[RoleImageUrls] = cache.get(ROLE_IMAGE_URLS_CACHE_KEY)
+    if role_image_urls is not None:
+        return role_image_urls
+
+    role_image_urls = RoleImageUrls()
+    device_role_ct = ContentType.objects.get_for_model(DeviceRole)
+    for role_image in RoleImage.objects.all():
+        if role_image.content_type_id == device_role_ct.pk:
+            role_image_urls.device_roles[role_image.object_id] = role_image.get_image_url()
+        else:
+            role_image_urls.content_types[role_image.content_type_id] = role_image.get_image_url()
+
+    cache.set(ROLE_IMAGE_URLS_CACHE_KEY, role_image_urls, None)
+    return role_image_urls
+
+
+def invalidate_role_image_urls():
+    cache.delete(ROLE_IMAGE_URLS_CACHE_KEY)
+
+
+class TopologyEdge(models.Model):
+    """Precomputed edge between two devices
+
+    `object_id` is the cable, wireless link or origin interface (of a
+    logical connection) the edge is drawn for, depending on `kind`. The rows
+    are kept current by the handlers in `signals` while the `adjacency_table`
+    setting is enabled and fully rebuilt by `rebuild_topology_edges`
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "object_id"]),
+            models.Index(fields=["kind", "from_device", "to_device"]),
+        ]
+
+    objects: "models.Manager[TopologyEdge]"
+
+    KIND_CABLE = "cable"
+    KIND_WIRELESS = "wireless"
+    KIND_INTERFACE = "interface"
+
+    kind = models.CharField(max_length=16)
+    object_id = models.PositiveBigIntegerField()
+
+    from_device = models.ForeignKey(
+        "dcim.Device", on_delete=models.CASCADE, related_name="+"
+    )
+    from_termination_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    from_termination_id = models.PositiveBigIntegerField()
+    from_name = models.CharField(max_length=255, blank=True)
+    from_cable_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    to_device = models.ForeignKey(
+        "dcim.Device", on_delete=models.CASCADE, related_name="+"
+    )
+    to_termination_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    to_termination_id = models.PositiveBigIntegerField()
+    to_name = models.CharField(max_length=255, blank=True)
+    to_cable_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    color = models.CharField(max_length=6, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.from_device_id} - {self.to_device_id}"
+
+
+class NodeCoordinate(models.Model):
+    """Saved position of a topology node
+
+    nodes are devices, circuits, power panels and power feeds. `layout` names
+    one of several layouts of the same nodes, the default layout has an empty
+    name
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["layout", "content_type", "object_id"],
+                name="netbox_topology_views_nodecoordinate_unique",
+            ),
+        ]
+
+    objects: "models.Manager[NodeCoordinate]"
+
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    object_id = models.PositiveBigIntegerField()
+    layout = models.CharField(max_length=100, blank=True)
+    x = models.IntegerField()
+    y = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id} ({self.layout}): {self.x};{self.y}"
+
+
+NodeKey = Tuple[Type[models.Model], int]
+
+
+def get_saved_coordinates(
+    objects: Iterable[models.Model], layout: str = ""
+) -> Dict[NodeKey, Tuple[int, int]]:
+    """Get the saved coordinates of nodes in one query, keyed by model and pk"""
+    object_ids: DefaultDict[Type[models.Model], Set[int]] = defaultdict(set)
+    for obj in objects:
+        object_ids[type(obj)].add(obj.pk)
+    if not object_ids:
+        return {}
+
+    models_by_type: Dict[int, Type[models.Model]] = {}
+    filter = Q()
+    for model, ids in object_ids.items():
+        content_type = ContentType.objects.get_for_model(model)
+        models_by_type[content_type.pk] = model
+        filter |= Q(content_type=content_type, object_id__in=ids)
+
+    return {
+        (models_by_type[content_type_id], object_id): (x, y)
+        for content_type_id, object_id, x, y in NodeCoordinate.objects.filter(
+            filter, layout=layout
+        ).values_list("content_type_id", "object_id", "x", "y")
+    }
+
+
+def save_coordinates(coordinates: Dict[NodeKey, Tuple[int, int]], layout: str = ""):
+    """Insert or update the coordinates of nodes with one bulk upsert"""
+    NodeCoordinate.objects.bulk_create(
+        [
+            NodeCoordinate(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id=pk,
+                layout=layout,
+                x=x,
+                y=y,
+            )
+            for (model, pk), (x, y) in coordinates.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["layout", "content_type", "object_id"],
+        update_fields=["x", "y"],
+    )
+
+
+class SavedTopologyView(models.Model):
+    """Named topology with a precomputed snapshot
+
+    `query` is the querystring of the topology page, the device filters and
+    the show options. The snapshot is the compact payload of the topology
+    (without tooltips) and is stale once the topology generation it was
+    built at has passed
+    """
+
+    class Meta:
+        ordering = ("name",)
+
+    objects: "models.Manager[SavedTopologyView]"
+
+    name = models.CharField(max_length=100, unique=True)
+    query = models.TextField(blank=True)
+
+    snapshot = models.JSONField(null=True, blank=True, editable=False)
+    snapshot_built = models.DateTimeField(null=True, blank=True, editable=False)
+    snapshot_generation = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse("plugins:netbox_topology_views:saved_view", args=[self.pk])
+
+    def is_stale(self, generation: int) -> bool:
+        return self.snapshot_built is None or self.snapshot_generation != generation
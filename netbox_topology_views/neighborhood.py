@@ -0,0 +1,181 @@
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from dcim.models import Device, Interface
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from wireless.models import WirelessLink
+
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.models import TopologyEdge
+from netbox_topology_views.topology import (
+    get_cable_pairs,
+    get_path_destinations,
+    get_topology_data,
+    is_drawn_termination_type,
+)
+
+
+def get_cable_neighbors(device_ids: Set[int]) -> Set[int]:
+    ignore_cable_type = settings.PLUGINS_CONFIG["netbox_topology_views"][
+        "ignore_cable_type"
+    ]
+    cable_pairs = get_cable_pairs(
+        (Q(_device_id__in=device_ids) | Q(cable__terminations___device_id__in=device_ids))
+        & Q(_device__isnull=False, cable__terminations___device__isnull=False)
+    )
+    return {
+        device_id
+        for _, _, a_type, _, a_device_id, b_type, _, b_device_id in cable_pairs
+        if is_drawn_termination_type(a_type, ignore_cable_type)
+        and is_drawn_termination_type(b_type, ignore_cable_type)
+        for device_id in (a_device_id, b_device_id)
+    }
+
+
+def get_logical_neighbors(device_ids: Set[int]) -> Set[int]:
+    interfaces = list(
+        Interface.objects.filter(
+            device_id__in=device_ids, _path__is_complete=True
+        ).select_related("_path")
+    )
+    _, destinations = get_path_destinations(interfaces)
+    return {
+        destination.device_id
+        for destination in destinations.values()
+        if isinstance(destination, Interface)
+    }
+
+
+def get_wireless_neighbors(device_ids: Set[int]) -> Set[int]:
+    wlan_links = WirelessLink.objects.filter(
+        Q(_interface_a_device_id__in=device_ids) | Q(_interface_b_device_id__in=device_ids)
+    ).values_list("_interface_a_device_id", "_interface_b_device_id")
+    return {device_id for link in wlan_links for device_id in link}
+
+
+def get_table_neighbors(kinds: Iterable[str]) -> Callable[[Set[int]], Set[int]]:
+    """Get neighbors from the adjacency table, one query for all kinds"""
+    ignore_cable_type = settings.PLUGINS_CONFIG["netbox_topology_views"][
+        "ignore_cable_type"
+    ]
+
+    def get_neighbors(device_ids: Set[int]) -> Set[int]:
+        edges = TopologyEdge.objects.filter(
+            Q(from_device_id__in=device_ids) | Q(to_device_id__in=device_ids),
+            kind__in=kinds,
+        ).values_list(
+            "kind",
+            "from_termination_type_id",
+            "to_termination_type_id",
+            "from_device_id",
+            "to_device_id",
+        )
+        return {
+            device_id
+            for kind, from_type, to_type, from_device_id, to_device_id in edges
+            if kind != TopologyEdge.KIND_CABLE
+            or (
+                is_drawn_termination_type(from_type, ignore_cable_type)
+                and is_drawn_termination_type(to_type, ignore_cable_type)
+            )
+            for device_id in (from_device_id, to_device_id)
+        }
+
+    return get_neighbors
+
+
+def get_neighborhood(
+    device_ids: Iterable[int],
+    hops: int,
+    max_nodes: int,
+    show_cables: bool,
+    show_logical_connections: bool,
+    show_wireless: bool,
+) -> Set[int]:
+    """Get the devices within `hops` connections of the given devices
+
+    a breadth first search over the enabled connection layers, every level
+    costs a fixed number of queries for the whole ring of devices. The search
+    stops after `hops` levels or once `max_nodes` devices are found, the last
+    ring is then cut off in the order of the device ids
+    """
+    if settings.PLUGINS_CONFIG["netbox_topology_views"]["adjacency_table"]:
+        kinds = [
+            kind
+            for kind, enabled in (
+                (TopologyEdge.KIND_CABLE, show_cables),
+                (TopologyEdge.KIND_INTERFACE, show_logical_connections),
+                (TopologyEdge.KIND_WIRELESS, show_wireless),
+            )
+            if enabled
+        ]
+        layers = [get_table_neighbors(kinds)] if kinds else []
+    else:
+        layers = [
+            get_neighbors
+            for get_neighbors, enabled in (
+                (get_cable_neighbors, show_cables),
+                (get_logical_neighbors, show_logical_connections),
+                (get_wireless_neighbors, show_wireless),
+            )
+            if enabled
+        ]
+
+    found = set(device_ids)
+    frontier = set(found)
+    for _ in range(hops):
+        if not frontier or len(found) >= max_nodes:
+            break
+
+        ring: Set[int] = set()
+        for get_neighbors in layers:
+            ring |= get_neighbors(frontier)
+        ring.discard(None)
+        ring -= found
+
+        frontier = set(sorted(ring)[: max_nodes - len(found)])
+        found |= frontier
+    return found
+
+
+def get_neighborhood_topology_data(
+    queryset: QuerySet,
+    hide_unconnected: bool,
+    save_coords: bool,
+    show_cables: bool,
+    show_circuit: bool,
+    show_logical_connections: bool,
+    show_power: bool,
+    show_wireless: bool,
+    hops: int = 1,
+    build: Callable[..., Optional[Dict]] = get_topology_data,
+    timings: Optional[TopologyTimings] = None,
+    **kwargs,
+) -> Optional[Dict]:
+    """Build the topology of the neighborhood of the devices in `queryset`
+
+    `build` is called with the neighborhood instead of the queryset and
+    the remaining arguments
+    """
+    timings = TopologyTimings() if timings is None else timings
+    with timings.stage("neighborhood"):
+        device_ids = get_neighborhood(
+            queryset.values_list("pk", flat=True),
+            hops,
+            settings.PLUGINS_CONFIG["netbox_topology_views"]["neighborhood_max_nodes"],
+            show_cables,
+            show_logical_connections,
+            show_wireless,
+        )
+    return build(
+        Device.objects.filter(pk__in=device_ids),
+        hide_unconnected,
+        save_coords,
+        show_cables,
+        show_circuit,
+        show_logical_connections,
+        show_power,
+        show_wireless,
+        timings=timings,
+        **kwargs,
+    )
@@ -0,0 +1,150 @@
+from circuits.models import Circuit, CircuitTermination, Provider
+from dcim.models import (
+    Cable,
+    CablePath,
+    CableTermination,
+    ConsolePort,
+    ConsoleServerPort,
+    Device,
+    DeviceRole,
+    FrontPort,
+    Interface,
+    PowerFeed,
+    PowerOutlet,
+    PowerPanel,
+    PowerPort,
+    RearPort,
+)
+from dcim.utils import decompile_path_node
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wireless.models import WirelessLink
+
+from netbox_topology_views.adjacency import update_topology_edges
+from netbox_topology_views.caching import bump_topology_generation
+from netbox_topology_views.models import (
+    NodeCoordinate,
+    RoleImage,
+    TopologyEdge,
+    invalidate_role_image_urls,
+)
+
+# models whose changes can alter a computed topology
+TOPOLOGY_MODELS = (
+    Cable,
+    CablePath,
+    CableTermination,
+    Circuit,
+    CircuitTermination,
+    ConsolePort,
+    ConsoleServerPort,
+    Device,
+    DeviceRole,
+    FrontPort,
+    Interface,
+    PowerFeed,
+    PowerOutlet,
+    PowerPanel,
+    PowerPort,
+    Provider,
+    RearPort,
+    RoleImage,
+    WirelessLink,
+)
+
+
+@receiver((post_save, post_delete), sender=RoleImage)
+def clear_role_image_urls(sender, **kwargs):
+    invalidate_role_image_urls()
+
+
+def topology_changed(sender, **kwargs):
+    bump_topology_generation()
+
+
+for model in TOPOLOGY_MODELS:
+    post_save.connect(topology_changed, sender=model)
+    post_delete.connect(topology_changed, sender=model)
+
+
+def delete_node_coordinates(sender, instance, **kwargs):
+    NodeCoordinate.objects.filter(
+        content_type=ContentType.objects.get_for_model(sender), object_id=instance.pk
+    ).delete()
+
+
+for model in (Device, Circuit, PowerPanel, PowerFeed):
+    post_delete.connect(delete_node_coordinates, sender=model)
+
+
+# the adjacency table is only maintained while it is enabled, run
+# `rebuild_topology_edges` after enabling it
+def adjacency_table_enabled() -> bool:
+    return settings.PLUGINS_CONFIG["netbox_topology_views"]["adjacency_table"]
+
+
+@receiver((post_save, post_delete), sender=Cable)
+def update_cable_edges(sender, instance: Cable, **kwargs):
+    if adjacency_table_enabled():
+        update_topology_edges(TopologyEdge.KIND_CABLE, [instance.pk])
+
+
+@receiver((post_save, post_delete), sender=CableTermination)
+def update_cable_termination_edges(sender, instance: CableTermination, **kwargs):
+    if adjacency_table_enabled():
+        update_topology_edges(TopologyEdge.KIND_CABLE, [instance.cable_id])
+
+
+@receiver((post_save, post_delete), sender=WirelessLink)
+def update_wireless_edges(sender, instance: WirelessLink, **kwargs):
+    if adjacency_table_enabled():
+        update_topology_edges(TopologyEdge.KIND_WIRELESS, [instance.pk])
+
+
+@receiver((post_save, post_delete), sender=CablePath)
+def update_path_edges(sender, instance: CablePath, **kwargs):
+    """Update the logical connections starting at the origins of a path"""
+    if not adjacency_table_enabled() or not instance.path:
+        return
+
+    interface_type = ContentType.objects.get_for_model(Interface)
+    update_topology_edges(
+        TopologyEdge.KIND_INTERFACE,
+        [
+            object_id
+            for content_type_id, object_id in map(decompile_path_node, instance.path[0])
+            if content_type_id == interface_type.pk
+        ],
+    )
+
+
+@receiver((post_save, post_delete), sender=Interface)
+def update_interface_edges(sender, instance: Interface, **kwargs):
+    """Update the edges showing the name of an interface"""
+    if not adjacency_table_enabled():
+        return
+
+    update_topology_edges(TopologyEdge.KIND_CABLE, [instance.cable_id])
+    update_topology_edges(TopologyEdge.KIND_WIRELESS, [instance.wireless_link_id])
+    update_topology_edges(
+        TopologyEdge.KIND_INTERFACE,
+        [
+            instance.pk,
+            *TopologyEdge.objects.filter(
+                kind=TopologyEdge.KIND_INTERFACE,
+                to_termination_type=ContentType.objects.get_for_model(Interface),
+                to_termination_id=instance.pk,
+            ).values_list("object_id", flat=True),
+        ],
+    )
+
+
+def update_port_edges(sender, instance, **kwargs):
+    if adjacency_table_enabled():
+        update_topology_edges(TopologyEdge.KIND_CABLE, [instance.cable_id])
+
+
+for model in (ConsolePort, ConsoleServerPort, FrontPort, PowerOutlet, PowerPort, RearPort):
+    post_save.connect(update_port_edges, sender=model)
@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from dcim.models import Device
+from django.db import connections
+from django.http import QueryDict
+from django.utils import timezone
+
+from netbox_topology_views.caching import get_topology_generation
+from netbox_topology_views.compact import get_compact_topology_data
+from netbox_topology_views.filters import DeviceFilterSet
+from netbox_topology_views.models import SavedTopologyView
+from netbox_topology_views.topology import get_topology_flags
+
+
+def build_snapshot(saved_view: SavedTopologyView):
+    """Build and save the snapshot of a saved view"""
+    # taken before the build, changes during the build leave the snapshot stale
+    generation = get_topology_generation()
+    query = QueryDict(saved_view.query)
+    saved_view.snapshot = get_compact_topology_data(
+        DeviceFilterSet(query, Device.objects.all()).qs,
+        **get_topology_flags(query),
+        lazy_tooltips=True,
+        layout=query.get("layout", ""),
+    )
+    saved_view.snapshot_generation = generation
+    saved_view.snapshot_built = timezone.now()
+    saved_view.save(
+        update_fields=["snapshot", "snapshot_generation", "snapshot_built"]
+    )
+
+
+def build_saved_view_snapshot(pk: int) -> Tuple[str, int, float]:
+    """Build the snapshot of the saved view with the given pk
+
+    runs in the worker processes, returns the name of the view, the amount
+    of nodes and the seconds the build took
+    """
+    start = time.perf_counter()
+    saved_view = SavedTopologyView.objects.get(pk=pk)
+    build_snapshot(saved_view)
+    nodes = len(saved_view.snapshot["nodes"]["id"]) if saved_view.snapshot else 0
+    return saved_view.name, nodes, time.perf_counter() - start
+
+
+def get_stale_saved_views(names: Iterable[str] = ()) -> List[int]:
+    """Get the pks of the saved views whose snapshot is missing or outdated"""
+    generation = get_topology_generation()
+    saved_views = SavedTopologyView.objects.only(
+        "pk", "snapshot_built", "snapshot_generation"
+    )
+    if names:
+        saved_views = saved_views.filter(name__in=names)
+    return [
+        saved_view.pk for saved_view in saved_views if saved_view.is_stale(generation)
+    ]
+
+
+def build_snapshots(
+    pks: List[int], workers: Optional[int] = None
+) -> Iterator[Tuple[str, int, float]]:
+    """Build the snapshots of saved views in a pool of `workers` processes
+
+    the processes are forked from the current one, its database connections
+    are closed first so no process shares them. Yields the results of
+    `build_saved_view_snapshot` in the order of `pks`
+    """
+    if not pks:
+        return
+
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=connections.close_all,
+    ) as executor:
+        yield from executor.map(build_saved_view_snapshot, pks)
@@ -0,0 +1,69 @@
+// Builds the tooltip of a node from its [label, value] rows
+export const nodeTitle = (rows) =>
+    `<table><tbody> ${rows
+        .map(([label, value]) => `<tr><th>${label}: </th><td>${value}</td></tr>`)
+        .join('')}</tbody></table>`
+
+// Expands the compact (columnar) topology payload into vis node and edge items,
+// knownLabel gives the labels of nodes drawn earlier which are not in the payload
+export const expandCompactTopology = (topologyData, knownLabel = () => undefined) => {
+    const { images, labels, edge_styles: edgeStyles } = topologyData
+    const nodeColumns = topologyData.nodes
+    const edgeColumns = topologyData.edges
+    const nodeLabels = new Map()
+
+    const nodes = nodeColumns.id.map((id, i) => {
+        const node = {
+            id,
+            name: nodeColumns.label[i],
+            label: nodeColumns.label[i],
+            shape: 'image',
+            href: nodeColumns.href[i],
+            image: images[nodeColumns.image[i]],
+            physics: nodeColumns.physics[i]
+        }
+        // without details the tooltips are loaded lazily
+        if (nodeColumns.details) {
+            const details = nodeColumns.details[i]
+            const rows = []
+            for (let j = 0; j < details.length; j += 2) {
+                rows.push([labels[details[j]], details[j + 1]])
+            }
+            node.title = nodeTitle(rows)
+        }
+        if (nodeColumns.border[i] !== null) {
+            node['color.border'] = nodeColumns.border[i]
+        }
+        if (nodeColumns.x[i] !== null) {
+            node.x = nodeColumns.x[i]
+            node.y = nodeColumns.y[i]
+        }
+        nodeLabels.set(id, node.label)
+        return node
+    })
+
+    const edges = edgeColumns.from.map((from, i) => {
+        const to = edgeColumns.to[i]
+        const { title, ...style } = edgeStyles[edgeColumns.style[i]]
+        const aDevice =
+            edgeColumns.a_device[i] ?? nodeLabels.get(from) ?? knownLabel(from)
+        const bDevice =
+            edgeColumns.b_device[i] ?? nodeLabels.get(to) ?? knownLabel(to)
+
+        const edge = {
+            ...style,
+            id: edgeColumns.id[i],
+            from,
+            to,
+            title:
+                `${title.replace('{label}', edgeColumns.label[i])} between` +
+                `<br>${aDevice} [${edgeColumns.a_name[i]}]` +
+                `<br>${bDevice} [${edgeColumns.b_name[i]}]`
+        }
+        if (edgeColumns.href[i] !== null) edge.href = edgeColumns.href[i]
+        if (edgeColumns.color[i] !== null) edge.color = edgeColumns.color[i]
+        return edge
+    })
+
+    return { nodes, edges }
+}
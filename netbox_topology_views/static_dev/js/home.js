@@ -1,6 +1,7 @@
 import { DataSet } from 'vis-data/esnext'
 import { Network } from 'vis-network/esnext'
 import { getCookie } from './csrftoken.js'
+import { expandCompactTopology, nodeTitle } from './compact.js'
 
 const options = {
     interaction: {
@@ -44,63 +45,285 @@ let graph = null // vis graph instance
 
 const container = document.querySelector('#visgraph')
 const coordSaveCheckbox = document.querySelector('#id_save_coords')
-;(function handleLoadData() {
-    if (!topologyData) return
 
-    function htmlTitle(text) {
-        const container = document.createElement('div')
-        container.innerHTML = text
-        return container
-    }
+// Coordinate saving, drags are coalesced into one request per pause
+const SAVE_COORDS_DELAY = 500
+const pendingCoords = new Map()
+let saveCoordsTimeout = null
+
+async function saveCoords() {
+    if (pendingCoords.size === 0) return
 
-    const nodes = new DataSet(
-        topologyData.nodes.map((node) => ({
-            ...node,
-            title: htmlTitle(node.title)
-        }))
+    const body = Array.from(pendingCoords, ([nodeId, nodePosition]) => ({
+        node_id: nodeId,
+        x: nodePosition.x,
+        y: nodePosition.y
+    }))
+    pendingCoords.clear()
+
+    // the coordinates are saved to the layout the topology was drawn with
+    const saveUrl = new URL(
+        '/api/plugins/netbox_topology_views/save-coords/save_coords_bulk/',
+        window.location.origin
     )
+    const layout = new URL(topologyUrl, window.location.origin).searchParams.get('layout')
+    if (layout) saveUrl.searchParams.set('layout', layout)
 
-    const edges = new DataSet(
-        topologyData.edges.map((node) => ({
-            ...node,
-            title: htmlTitle(node.title)
-        }))
+    const res = await fetch(
+        saveUrl,
+        {
+            method: 'PATCH',
+            headers: {
+                'X-CSRFToken': csrftoken,
+                Accept: 'application/json',
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        }
     )
+
+    if (!res.ok) {
+        console.error('Could not save coordinates', res.status, res.statusText)
+    }
+}
+
+// Open topologies are refreshed in place with the changes since the drawn version
+const REFRESH_INTERVAL = 60000
+
+function htmlTitle(text) {
+    const container = document.createElement('div')
+    container.innerHTML = text
+    return container
+}
+
+// nodes without a title keep it unset, their tooltip is loaded on hover
+const nodeItem = (node) => ({
+    ...node,
+    title: node.title === undefined ? undefined : htmlTitle(node.title)
+})
+
+const edgeItem = (edge) => ({ ...edge, title: htmlTitle(edge.title) })
+
+const topologyVersion = (res) =>
+    (res.headers.get('ETag') ?? '').replace(/^W\//, '').replaceAll('"', '')
+
+;(async function handleLoadData() {
+    if (!topologyUrl) return
+
+    let url = new URL(topologyUrl, window.location.origin)
+    // with group_by the devices are drawn as clusters, which expand on double click
+    const clustered = Boolean(url.searchParams.get('group_by'))
+    if (clustered) {
+        const clustersUrl = new URL(
+            '/api/plugins/netbox_topology_views/topology/clusters/',
+            window.location.origin
+        )
+        clustersUrl.search = url.search
+        url = clustersUrl
+    }
+    url.searchParams.set('compact', 'true')
+    url.searchParams.set('lazy_tooltips', 'true')
+    // saved views are drawn from their snapshot, which is rebuilt in the
+    // background, and built on request if the snapshot cannot be loaded
+    let res = null
+    if (snapshotUrl) {
+        res = await fetch(snapshotUrl, {
+            headers: { Accept: 'application/json' }
+        })
+    }
+    const fromSnapshot = res !== null && res.ok
+    if (!fromSnapshot) {
+        res = await fetch(url, {
+            headers: { Accept: 'application/json' }
+        })
+    }
+    if (!res.ok) {
+        console.error('Could not load topology', res.status, res.statusText)
+        return
+    }
+
+    let version = topologyVersion(res)
+    let topologyData = await res.json()
+    if (!topologyData) return
+    if (topologyData.format === 'compact') {
+        topologyData = expandCompactTopology(topologyData)
+    }
+
+    const nodes = new DataSet(topologyData.nodes.map(nodeItem))
+    const edges = new DataSet(topologyData.edges.map(edgeItem))
     graph = new Network(container, { nodes, edges }, options)
     graph.fit()
 
+    function applyChanges(removed, changed) {
+        if (changed?.format === 'compact') {
+            changed = expandCompactTopology(changed, (id) => nodes.get(id)?.label)
+        }
+        edges.remove(removed.edges)
+        nodes.remove(removed.nodes)
+        if (changed) {
+            nodes.update(changed.nodes.map(nodeItem))
+            edges.update(changed.edges.map(edgeItem))
+        }
+    }
+
+    function replaceTopology(topology) {
+        if (topology.format === 'compact') {
+            topology = expandCompactTopology(topology)
+        }
+        const nodeIds = new Set(topology.nodes.map((node) => node.id))
+        const edgeIds = new Set(topology.edges.map((edge) => edge.id))
+        applyChanges(
+            {
+                nodes: nodes.getIds().filter((id) => !nodeIds.has(id)),
+                edges: edges.getIds().filter((id) => !edgeIds.has(id))
+            },
+            topology
+        )
+    }
+
+    async function loadClusters() {
+        const res = await fetch(url, {
+            headers: { Accept: 'application/json' }
+        })
+        if (!res.ok) return
+        replaceTopology((await res.json()) ?? { nodes: [], edges: [] })
+    }
+
+    let refreshing = false
+
+    async function refreshTopology() {
+        if (refreshing || document.hidden) return
+        refreshing = true
+        try {
+            if (clustered) {
+                await loadClusters()
+                return
+            }
+
+            const changesUrl = new URL(
+                '/api/plugins/netbox_topology_views/topology/changes/',
+                window.location.origin
+            )
+            changesUrl.search = url.search
+            changesUrl.searchParams.set('since', version)
+            const res = await fetch(changesUrl, {
+                headers: { Accept: 'application/json' }
+            })
+            if (!res.ok) return
+
+            const changes = await res.json()
+            if (changes.full) {
+                // the drawn version is no longer known, compare against the new topology
+                replaceTopology(changes.topology ?? { nodes: [], edges: [] })
+            } else {
+                applyChanges(changes.removed, changes.changed)
+            }
+            version = changes.version
+        } finally {
+            refreshing = false
+        }
+    }
+
+    if (!fromSnapshot) setInterval(refreshTopology, REFRESH_INTERVAL)
+
+    // Lazy tooltips, hovered nodes are fetched in batches
+    const pendingTooltips = new Map()
+    let tooltipsTimeout = null
+
+    async function loadTooltips() {
+        const nodeIds = new Map(pendingTooltips)
+        pendingTooltips.clear()
+
+        const tooltipsUrl = new URL(
+            '/api/plugins/netbox_topology_views/topology/tooltips/',
+            window.location.origin
+        )
+        nodeIds.forEach((_, nodeId) =>
+            tooltipsUrl.searchParams.append('node_id', nodeId)
+        )
+        const res = await fetch(tooltipsUrl, {
+            headers: { Accept: 'application/json' }
+        })
+        if (!res.ok) return
+
+        const details = await res.json()
+        nodes.update(
+            Object.entries(details).map(([nodeId, rows]) => ({
+                id: nodeIds.get(nodeId),
+                title: htmlTitle(nodeTitle(rows))
+            }))
+        )
+    }
+
+    graph.on('hoverNode', ({ node }) => {
+        if (nodes.get(node).title !== undefined) return
+        pendingTooltips.set(String(node), node)
+        clearTimeout(tooltipsTimeout)
+        tooltipsTimeout = setTimeout(loadTooltips, 50)
+    })
+
+    // Neighborhood expansion, right clicking a device adds the devices connected to it
+    const OPTION_PARAMS = ['hide_unconnected', 'save_coords', 'layout']
+
+    async function expandNode(node) {
+        const neighborhoodUrl = new URL(
+            '/api/plugins/netbox_topology_views/topology/neighborhood/',
+            window.location.origin
+        )
+        new URL(topologyUrl, window.location.origin).searchParams.forEach(
+            (value, key) => {
+                if (key.startsWith('show_') || OPTION_PARAMS.includes(key)) {
+                    neighborhoodUrl.searchParams.append(key, value)
+                }
+            }
+        )
+        neighborhoodUrl.searchParams.set('id', node)
+        neighborhoodUrl.searchParams.set('hops', '1')
+        neighborhoodUrl.searchParams.set('compact', 'true')
+        neighborhoodUrl.searchParams.set('lazy_tooltips', 'true')
+
+        const res = await fetch(neighborhoodUrl, {
+            headers: { Accept: 'application/json' }
+        })
+        if (!res.ok) return
+
+        let neighborhood = await res.json()
+        if (!neighborhood) return
+        if (neighborhood.format === 'compact') {
+            neighborhood = expandCompactTopology(neighborhood, (id) => nodes.get(id)?.label)
+        }
+        // drawn nodes keep their position
+        nodes.add(
+            neighborhood.nodes.filter((item) => nodes.get(item.id) === null).map(nodeItem)
+        )
+        edges.update(neighborhood.edges.map(edgeItem))
+    }
+
+    graph.on('oncontext', (params) => {
+        const node = graph.getNodeAt(params.pointer.DOM)
+        if (typeof node !== 'number') return
+        params.event.preventDefault()
+        expandNode(node)
+    })
+
     graph.on('dragEnd', (params) => {
         if (coordSaveCheckbox == null) return
         if (!coordSaveCheckbox.checked) return
-        
-        Promise.allSettled(
-            Object.entries(graph.getPositions(params.nodes)).map(
-                async ([nodeId, nodePosition]) => {
-                    const res = await fetch(
-                        '/api/plugins/netbox_topology_views/save-coords/save_coords/',
-                        {
-                            method: 'PATCH',
-                            headers: {
-                                'X-CSRFToken': csrftoken,
-                                Accept: 'application/json',
-                                'Content-Type': 'application/json'
-                            },
-                            body: JSON.stringify({
-                                node_id: nodeId,
-                                x: nodePosition.x,
-                                y: nodePosition.y
-                            })
-                        }
-                    )
-
-                    console.log(nodeId, res.status, res.statusText)
-                }
-            )
+
+        Object.entries(graph.getPositions(params.nodes)).forEach(
+            ([nodeId, nodePosition]) => pendingCoords.set(nodeId, nodePosition)
         )
+        clearTimeout(saveCoordsTimeout)
+        saveCoordsTimeout = setTimeout(saveCoords, SAVE_COORDS_DELAY)
     })
 
     graph.on('doubleClick', (params) => {
-        if (params.nodes.length > 0) {
+        const clusters = params.nodes.filter((node) => nodes.get(node).cluster)
+        if (clusters.length > 0) {
+            clusters.forEach((cluster) => url.searchParams.append('expand', cluster))
+            loadClusters()
+        }
+        else if (params.nodes.length > 0) {
             params.nodes.forEach((node) => {
                 window.open(nodes.get(node).href, '_blank')
             })
@@ -113,6 +336,31 @@ const coordSaveCheckbox = document.querySelector('#id_save_coords')
     })
 })()
 
+// Save the filters and options of the page as a named view
+const saveViewButton = document.querySelector('#btnSaveView')
+saveViewButton?.addEventListener('click', async (e) => {
+    e.preventDefault()
+    const name = window.prompt('Name of the saved view')
+    if (!name) return
+
+    const query = new URLSearchParams(window.location.search)
+    query.delete('draw_init')
+    const res = await fetch('/api/plugins/netbox_topology_views/saved-views/', {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            Accept: 'application/json',
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ name, query: query.toString() })
+    })
+    if (!res.ok) {
+        console.error('Could not save view', res.status, res.statusText)
+        return
+    }
+    window.location.href = (await res.json()).page_url
+})
+
 // Download Graph
 const MIME_TYPE = 'image/png'
 
@@ -0,0 +1,60 @@
+from dcim.models import Device
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from netbox_topology_views.management.commands.benchmark_topology import (
+    BENCHMARK_FLAGS,
+    create_fixtures,
+)
+from netbox_topology_views.topology import get_topology_data
+
+
+class TopologyQueryCountTestCase(TestCase):
+    """The queries of a topology build do not grow with the devices"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_fixtures(
+            sites=3,
+            devices=20,
+            cables=30,
+            chains=3,
+            circuits=3,
+            power_feeds=3,
+            wireless_links=3,
+            seed=0,
+        )
+
+    def build(self, site_slugs, **flags):
+        return get_topology_data(
+            Device.objects.filter(site__slug__in=site_slugs),
+            hide_unconnected=False,
+            save_coords=False,
+            **flags,
+        )
+
+    def assertConstantQueries(self, **flags):
+        small = ["benchmark-site-0"]
+        large = ["benchmark-site-0", "benchmark-site-1", "benchmark-site-2"]
+
+        # fill the content type cache
+        self.build(large, **flags)
+
+        with CaptureQueriesContext(connection) as queries:
+            small_data = self.build(small, **flags)
+        with self.assertNumQueries(len(queries)):
+            large_data = self.build(large, **flags)
+
+        self.assertGreater(len(large_data["nodes"]), len(small_data["nodes"]))
+
+    def test_all_layers(self):
+        self.assertConstantQueries(**dict.fromkeys(BENCHMARK_FLAGS, True))
+
+    def test_devices_only(self):
+        self.assertConstantQueries(**dict.fromkeys(BENCHMARK_FLAGS, False))
+
+    def test_cables(self):
+        flags = dict.fromkeys(BENCHMARK_FLAGS, False)
+        flags["show_cables"] = True
+        self.assertConstantQueries(**flags)
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from dcim.models import DeviceRole, PowerPanel
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from netbox_topology_views.models import RoleImage
+from netbox_topology_views.views import TopologyImagesView
+
+
+class TopologyImagesViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin")
+
+        device_role_type = ContentType.objects.get_for_model(DeviceRole)
+        roles = DeviceRole.objects.bulk_create(
+            DeviceRole(name=f"Role {i}", slug=f"role-{i}", color="9e9e9e")
+            for i in range(5)
+        )
+        RoleImage.objects.bulk_create(
+            RoleImage(
+                content_type=device_role_type,
+                object_id=role.pk,
+                image=f"netbox_topology_views/img/{role.slug}.png",
+            )
+            for role in roles[:3]
+        )
+        RoleImage.objects.create(
+            content_type=ContentType.objects.get_for_model(PowerPanel),
+            image="netbox_topology_views/img/power-panel.png",
+        )
+
+    def test_get_queries(self):
+        """The roles and their images are loaded with one query each"""
+        request = RequestFactory().get("/")
+        request.user = self.user
+        view = TopologyImagesView.as_view()
+
+        with mock.patch(
+            "netbox_topology_views.views.render", return_value=HttpResponse()
+        ) as render:
+            # fill the content type cache
+            view(request)
+            with self.assertNumQueries(2):
+                view(request)
+
+        roles = render.call_args.args[2]["roles"]
+        self.assertEqual(len(roles), 5 + 3)
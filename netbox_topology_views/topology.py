@@ -0,0 +1,1317 @@
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import (
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from circuits.models import Circuit, CircuitTermination
+from dcim.models import (
+    Cable,
+    CableTermination,
+    Device,
+    FrontPort,
+    Interface,
+    PowerFeed,
+    PowerPanel,
+    RearPort,
+)
+from dcim.utils import decompile_path_node
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections
+from django.db.models import Model, Q, QuerySet
+from django.http import QueryDict
+from wireless.models import WirelessLink
+
+from netbox_topology_views.instrumentation import TopologyTimings
+from netbox_topology_views.layout import compute_layout
+from netbox_topology_views.models import (
+    RoleImageUrls,
+    TopologyEdge,
+    get_role_image_urls,
+    get_saved_coordinates,
+)
+from netbox_topology_views.utils import find_image_url, get_model_slug
+
+supported_termination_types = [
+    "interface",
+    "front port",
+    "rear port",
+    "power outlet",
+    "power port",
+    "console port",
+    "console server port",
+]
+
+# the show_*/hide_* options, in the order get_topology_data takes them
+TOPOLOGY_FLAGS = (
+    "hide_unconnected",
+    "save_coords",
+    "show_cables",
+    "show_circuit",
+    "show_logical_connections",
+    "show_power",
+    "show_wireless",
+)
+
+# (content type id, object id) of a cable termination or path node
+TerminationRef = Tuple[int, int]
+
+# node id prefixes of the non-device nodes, device nodes use the bare pk
+NODE_ID_PREFIXES = {"c": Circuit, "p": PowerPanel, "f": PowerFeed}
+
+# relations read by get_node_details
+NODE_DETAIL_RELATIONS = {
+    Device: (
+        "device_type",
+        "device_role",
+        "primary_ip4",
+        "primary_ip6",
+        "site",
+        "location",
+        "rack",
+    ),
+    Circuit: ("provider", "type"),
+    PowerPanel: ("site", "location"),
+    PowerFeed: ("power_panel",),
+}
+
+
+def get_topology_flags(query: QueryDict) -> Dict[str, bool]:
+    return {flag: query.get(flag) == "on" for flag in TOPOLOGY_FLAGS}
+
+
+def parse_node_id(node_id) -> Optional[Tuple[Type[Model], int]]:
+    """Get the model and pk of a node id as assigned by `create_node`"""
+    node_id = str(node_id)
+    if node_id[:1] in NODE_ID_PREFIXES and node_id[1:].isnumeric():
+        return NODE_ID_PREFIXES[node_id[0]], int(node_id[1:])
+    if node_id.isnumeric():
+        return Device, int(node_id)
+    return None
+
+
+def get_image_for_entity(
+    entity: Union[Device, Circuit, PowerPanel, PowerFeed],
+    role_image_urls: Optional[RoleImageUrls] = None,
+):
+    if role_image_urls is None:
+        role_image_urls = get_role_image_urls()
+
+    if isinstance(entity, Device):
+        if url := role_image_urls.device_roles.get(entity.device_role_id):
+            return url
+        return find_image_url(entity.device_role.slug)
+
+    content_type = ContentType.objects.get_for_model(entity)
+    if url := role_image_urls.content_types.get(content_type.pk):
+        return url
+    return find_image_url(get_model_slug(entity.__class__))
+
+
+def get_node_id(device: Union[Device, Circuit, PowerPanel, PowerFeed]):
+    if isinstance(device, Circuit):
+        return f"c{device.pk}"
+    if isinstance(device, PowerPanel):
+        return f"p{device.pk}"
+    if isinstance(device, PowerFeed):
+        return f"f{device.pk}"
+    return device.pk
+
+
+def get_node_name(device: Union[Device, Circuit, PowerPanel, PowerFeed]) -> str:
+    if isinstance(device, Circuit):
+        return f"Circuit {device.cid}"
+    if isinstance(device, PowerPanel):
+        return f"Power Panel {device.pk}"
+    if isinstance(device, PowerFeed):
+        return f"Power Feed {device.pk}"
+    if device.name is None:
+        return "device name unknown"
+    return device.name
+
+
+def get_node_details(device: Union[Device, Circuit, PowerPanel, PowerFeed]):
+    """Get the (label, value) rows shown in the tooltip of a node"""
+    details = []
+    if isinstance(device, Circuit):
+        if device.provider is not None:
+            details.append(("Provider", device.provider.name))
+        if device.type is not None:
+            details.append(("Type", device.type.name))
+    elif isinstance(device, PowerPanel):
+        if device.site is not None:
+            details.append(("Site", device.site.name))
+        if device.location is not None:
+            details.append(("Location", device.location.name))
+    elif isinstance(device, PowerFeed):
+        if device.power_panel is not None:
+            details.append(("Power Panel", device.power_panel.name))
+        if device.type is not None:
+            details.append(("Type", device.type))
+        if device.supply is not None:
+            details.append(("Supply", device.supply))
+        if device.phase is not None:
+            details.append(("Phase", device.phase))
+        if device.amperage is not None:
+            details.append(("Amperage", device.amperage))
+        if device.voltage is not None:
+            details.append(("Voltage", device.voltage))
+    else:
+        if device.device_type is not None:
+            details.append(("Type", device.device_type.model))
+        if device.device_role.name is not None:
+            details.append(("Role", device.device_role.name))
+        if device.serial != "":
+            details.append(("Serial", device.serial))
+        if device.primary_ip is not None:
+            details.append(("IP Address", str(device.primary_ip.address)))
+        if device.site is not None:
+            details.append(("Site", device.site.name))
+        if device.location is not None:
+            details.append(("Location", device.location.name))
+        if device.rack is not None:
+            details.append(("Rack", device.rack.name))
+        if device.position is not None:
+            if device.face is not None:
+                details.append(("Position", f"{device.position} ({device.face})"))
+            else:
+                details.append(("Position", f"{device.position}"))
+    return details
+
+
+def get_node_coordinates(
+    saved: Optional[Tuple[int, int]],
+    save_coords: bool,
+    position: Optional[Tuple[int, int]] = None,
+) -> Tuple[Optional[int], Optional[int], bool]:
+    """Get the x and y of a node and whether physics applies to it
+
+    nodes without `saved` coordinates are placed at `position` if given
+    """
+    if saved is not None:
+        return saved[0], saved[1], False
+    if position is not None:
+        return position[0], position[1], False
+    if save_coords:
+        return None, None, False
+    return None, None, True
+
+
+def get_layout_tier(
+    device: Union[Device, Circuit, PowerPanel, PowerFeed], role_order: Dict[str, int]
+) -> Tuple[int, str]:
+    """Get the tier of a node in the server side layout
+
+    circuits are drawn on top, then the devices by role in the order of
+    `role_order`, other roles alphabetically, and the power feeds and panels
+    at the bottom
+    """
+    if isinstance(device, Circuit):
+        return 0, ""
+    if isinstance(device, PowerFeed):
+        return len(role_order) + 2, ""
+    if isinstance(device, PowerPanel):
+        return len(role_order) + 3, ""
+    name = device.device_role.name
+    return role_order.get(name, len(role_order)) + 1, name
+
+
+def get_nodes_details(node_ids: Iterable) -> Dict[str, List[Tuple[str, str]]]:
+    """Get the tooltip rows of several nodes, keyed by node id
+
+    the nodes are loaded with one query per node type
+    """
+    pks: DefaultDict[Type[Model], Dict[int, str]] = defaultdict(dict)
+    for node_id in node_ids:
+        if parsed := parse_node_id(node_id):
+            model, pk = parsed
+            pks[model][pk] = str(node_id)
+
+    details = {}
+    for model, node_pks in pks.items():
+        entities = model.objects.select_related(*NODE_DETAIL_RELATIONS[model]).in_bulk(
+            node_pks.keys()
+        )
+        for pk, entity in entities.items():
+            details[node_pks[pk]] = get_node_details(entity)
+    return details
+
+
+def create_node(
+    device: Union[Device, Circuit, PowerPanel, PowerFeed],
+    save_coords: bool,
+    role_image_urls: Optional[RoleImageUrls] = None,
+    lazy_tooltips: bool = False,
+    position: Optional[Tuple[int, int]] = None,
+    saved: Optional[Tuple[int, int]] = None,
+):
+    node = {}
+    node["id"] = get_node_id(device)
+
+    if isinstance(device, Device) and device.device_role.color != "":
+        node["color.border"] = "#" + device.device_role.color
+
+    if not lazy_tooltips:
+        node_content = "".join(
+            f"<tr><th>{label}: </th><td>{value}</td></tr>"
+            for label, value in get_node_details(device)
+        )
+        node["title"] = "<table><tbody> %s</tbody></table>" % (node_content)
+
+    dev_name = get_node_name(device)
+    node["name"] = dev_name
+    node["label"] = dev_name
+    node["shape"] = "image"
+    node["href"] = device.get_absolute_url()
+    node["image"] = get_image_for_entity(device, role_image_urls)
+
+    x, y, node["physics"] = get_node_coordinates(saved, save_coords, position)
+    if x is not None:
+        node["x"] = x
+        node["y"] = y
+    return node
+
+
+def get_edge_names(termination_a: Dict, termination_b: Dict) -> Tuple[str, str, str, str]:
+    """Get the termination and device names of both ends of an edge"""
+    cable_a_name = (
+        "device A name unknown"
+        if termination_a["termination_name"] is None
+        else termination_a["termination_name"]
+    )
+    cable_a_dev_name = (
+        "device A name unknown"
+        if termination_a["termination_device_name"] is None
+        else termination_a["termination_device_name"]
+    )
+    cable_b_name = (
+        "device A name unknown"
+        if termination_b["termination_name"] is None
+        else termination_b["termination_name"]
+    )
+    cable_b_dev_name = (
+        "cable B name unknown"
+        if termination_b["termination_device_name"] is None
+        else termination_b["termination_device_name"]
+    )
+
+    return cable_a_name, cable_a_dev_name, cable_b_name, cable_b_dev_name
+
+
+def get_edge_key(edge_spec: Dict) -> str:
+    """Get an id of an edge from the object it is drawn for
+
+    unlike a running number the key stays the same between builds of a
+    topology, so changed edges can be matched between two versions
+    """
+    cable = edge_spec.get("cable")
+    if edge_spec.get("interface") is not None:
+        return f"interface{edge_spec['interface'].pk}"
+    if edge_spec.get("power") is not None:
+        return f"power{edge_spec['termination_b']['device_id']}"
+    if edge_spec.get("wireless") is not None and cable is not None:
+        return f"wireless{cable.pk}"
+    if edge_spec.get("circuit") is not None and cable is not None:
+        return f"circuit{cable.pk}"
+    if cable is not None:
+        return f"cable{cable.pk}"
+    return "{}-{}".format(
+        edge_spec["termination_a"]["device_id"], edge_spec["termination_b"]["device_id"]
+    )
+
+
+def create_edge(
+    edge_id: Union[int, str],
+    termination_a: Dict,
+    termination_b: Dict,
+    circuit: Optional[Dict] = None,
+    cable: Optional[Cable] = None,
+    wireless: Optional[Dict] = None,
+    power: Optional[bool] = None,
+    interface: Optional[Interface] = None,
+):
+    cable_a_name, cable_a_dev_name, cable_b_name, cable_b_dev_name = get_edge_names(
+        termination_a, termination_b
+    )
+
+    edge = {}
+    edge["id"] = edge_id
+    edge["from"] = termination_a["device_id"]
+    edge["to"] = termination_b["device_id"]
+    title = "Cable"
+
+    if circuit is not None:
+        edge["dashes"] = True
+        title = f"Circuit provider: {circuit['provider_name']}<br>Termination"
+
+    elif wireless is not None:
+        edge["dashes"] = [2, 10, 2, 10]
+        title = "Wireless Connection"
+
+    elif power is not None:
+        edge["dashes"] = [5, 5, 3, 3]
+        title = "Power Connection"
+
+    elif interface is not None:
+        title = "Interface Connection"
+        edge["width"] = 3
+        edge["dashes"] = [1, 10, 1, 10]
+        edge["arrows"] = {"to": {"enabled": True, "scaleFactor": 0.5}, "from": {"enabled": True, "scaleFactor": 0.5}}
+        edge["color"] = '#f1c232'
+        edge["href"] = interface.get_absolute_url() + "trace"
+
+    edge[
+        "title"
+    ] = f"{title} between<br>{cable_a_dev_name} [{cable_a_name}]<br>{cable_b_dev_name} [{cable_b_name}]"
+
+    if cable is not None:
+        edge["href"] = cable.get_absolute_url()
+        if hasattr(cable, 'color') and cable.color != "":
+            edge["color"] = "#" + cable.color
+
+    return edge
+
+
+def create_circuit_termination(termination, device_names: Dict[int, str]):
+    if isinstance(termination, CircuitTermination):
+        return {
+            "termination_name": termination.circuit.provider.name,
+            "termination_device_name": termination.circuit.cid,
+            "device_id": "c{}".format(termination.circuit.pk),
+        }
+    if (
+        isinstance(termination, Interface)
+        or isinstance(termination, FrontPort)
+        or isinstance(termination, RearPort)
+    ):
+        return {
+            "termination_name": termination.name,
+            "termination_device_name": device_names.get(termination.device_id),
+            "device_id": termination.device_id,
+        }
+    return None
+
+
+def resolve_terminations(refs: Iterable[TerminationRef]) -> Dict[TerminationRef, Model]:
+    """Resolve termination references
+
+    groups the references by content type and fetches every group with a
+    single `in_bulk` query, references to deleted objects are left out
+    """
+    object_ids: DefaultDict[int, set] = defaultdict(set)
+    for content_type_id, object_id in refs:
+        object_ids[content_type_id].add(object_id)
+
+    terminations: Dict[TerminationRef, Model] = {}
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+
+        queryset = model.objects.all()
+        if model is CircuitTermination:
+            queryset = queryset.select_related("circuit__provider")
+
+        for pk, termination in queryset.in_bulk(ids).items():
+            terminations[(content_type_id, pk)] = termination
+
+    return terminations
+
+
+def get_termination_names(refs: Iterable[TerminationRef]) -> Dict[TerminationRef, str]:
+    """Get the names of terminations with one `values_list` query per content type"""
+    object_ids: DefaultDict[int, set] = defaultdict(set)
+    for content_type_id, object_id in refs:
+        object_ids[content_type_id].add(object_id)
+
+    names: Dict[TerminationRef, str] = {}
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        for pk, name in model.objects.filter(pk__in=ids).values_list("pk", "name"):
+            names[(content_type_id, pk)] = name
+    return names
+
+
+def get_cable_ends(cable_ids: Iterable[int]) -> Dict[int, Dict[str, TerminationRef]]:
+    """Get the first termination of both ends of the given cables
+
+    mirrors `cable.a_terminations[0]` and `cable.b_terminations[0]`
+    in a single query for all cables
+    """
+    ends: DefaultDict[int, Dict[str, TerminationRef]] = defaultdict(dict)
+    cable_terminations = (
+        CableTermination.objects.filter(cable_id__in=set(cable_ids))
+        .order_by("cable_id", "cable_end", "pk")
+        .values_list("cable_id", "cable_end", "termination_type_id", "termination_id")
+    )
+    for cable_id, cable_end, content_type_id, object_id in cable_terminations:
+        ends[cable_id].setdefault(cable_end, (content_type_id, object_id))
+    return ends
+
+
+def is_drawn_termination_type(content_type_id: int, ignore_cable_type: List[str]) -> bool:
+    name = ContentType.objects.get_for_id(content_type_id).name
+    return name not in ignore_cable_type and name in supported_termination_types
+
+
+def get_cable_pairs(filter: Q) -> List[Tuple[int, int, int, int, int, int, int, int]]:
+    """Pair the B terminations of cables with the A terminations of the same cable
+
+    one self join of the cable terminations, `filter` applies to both ends
+    with the A end referenced as `cable__terminations__`. Returns rows of
+    (cable id, B termination pk, A type, A id, A device id, B type, B id,
+    B device id) for every pair, ordered by cable and B termination
+    """
+    return list(
+        CableTermination.objects.filter(
+            Q(cable_end="B", cable__terminations__cable_end="A") & filter
+        )
+        .order_by("cable_id", "pk", "cable__terminations__pk")
+        .values_list(
+            "cable_id",
+            "pk",
+            "cable__terminations__termination_type_id",
+            "cable__terminations__termination_id",
+            "cable__terminations___device_id",
+            "termination_type_id",
+            "termination_id",
+            "_device_id",
+        )
+    )
+
+
+def get_path_destinations(
+    interfaces: Iterable[Interface],
+) -> Tuple[Dict[int, List[TerminationRef]], Dict[TerminationRef, Model]]:
+    """Get the destinations of the complete paths of interfaces
+
+    returns the destination references by interface pk and the resolved
+    destinations, the interfaces need their `_path` loaded. The references of
+    all paths are resolved together with one query per content type,
+    destinations which are among the given interfaces are not queried again
+    """
+    interface_type_id = ContentType.objects.get_for_model(Interface).pk
+    loaded: Dict[TerminationRef, Model] = {}
+    # the destinations of a complete path are the nodes of its last hop
+    interface_destinations: Dict[int, List[TerminationRef]] = {}
+    for interface in interfaces:
+        loaded[(interface_type_id, interface.pk)] = interface
+        if interface._path.path:
+            interface_destinations[interface.pk] = [
+                decompile_path_node(node) for node in interface._path.path[-1]
+            ]
+
+    refs = {ref for refs in interface_destinations.values() for ref in refs}
+    destinations = resolve_terminations(refs - loaded.keys())
+    destinations.update((ref, loaded[ref]) for ref in refs & loaded.keys())
+    return interface_destinations, destinations
+
+
+_layer_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_layer_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Get the thread pool shared by all topology builds of the process"""
+    global _layer_executor
+    if _layer_executor is None:
+        _layer_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="topology-layer"
+        )
+    return _layer_executor
+
+
+def reset_layer_executor():
+    global _layer_executor
+    _layer_executor = None
+
+
+# the threads of the pool do not exist in a forked process, which then
+# starts its own pool (e.g. the workers of `build_topology_snapshots`)
+os.register_at_fork(after_in_child=reset_layer_executor)
+
+
+class TopologyBuilder:
+    """Builds the nodes and edges of a topology
+
+    every enabled layer loads its rows in a fixed number of bulk queries, so the
+    amount of queries does not depend on the amount of devices in the queryset.
+    The queries of the layers run concurrently on `layer_workers` threads.
+    With `lazy_tooltips` the nodes get no title and only the device columns
+    needed to draw them are selected, tooltips are loaded on demand with
+    `get_nodes_details`. Topologies with at least `layout_node_threshold` nodes
+    without saved coordinates are laid out by `compute_layout`. The duration
+    and queries of every layer are recorded in `timings`
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        hide_unconnected: bool,
+        save_coords: bool,
+        show_cables: bool,
+        show_circuit: bool,
+        show_logical_connections: bool,
+        show_power: bool,
+        show_wireless: bool,
+        lazy_tooltips: bool = False,
+        timings: Optional[TopologyTimings] = None,
+        layout: str = "",
+    ):
+        if lazy_tooltips:
+            self.queryset = queryset.select_related("device_role").only(
+                "id",
+                "name",
+                "site",
+                "location",
+                "rack",
+                "device_role",
+                "device_role__name",
+                "device_role__slug",
+                "device_role__color",
+            )
+        else:
+            self.queryset = queryset.select_related(*NODE_DETAIL_RELATIONS[Device])
+        self.lazy_tooltips = lazy_tooltips
+        self.layout = layout
+        self.timings = TopologyTimings() if timings is None else timings
+        self.hide_unconnected = hide_unconnected
+        self.save_coords = save_coords
+        self.show_cables = show_cables
+        self.show_circuit = show_circuit
+        self.show_logical_connections = show_logical_connections
+        self.show_power = show_power
+        self.show_wireless = show_wireless
+
+        self.ignore_cable_type = settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "ignore_cable_type"
+        ]
+        self.hide_single_cable_logical_conns = bool(
+            settings.PLUGINS_CONFIG["netbox_topology_views"][
+                "hide_single_cable_logical_conns"
+            ]
+        )
+        self.layout_node_threshold = settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "layout_node_threshold"
+        ]
+        self.layer_workers = settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "layer_workers"
+        ]
+        self.adjacency_table = settings.PLUGINS_CONFIG["netbox_topology_views"][
+            "adjacency_table"
+        ]
+
+        self.role_image_urls: Optional[RoleImageUrls] = None
+        self.devices: Dict[int, Device] = {}
+        # hashed ids of the devices and their sites for membership tests
+        self.device_ids: Set[int] = set()
+        self.site_ids: Set[int] = set()
+
+        # node entities and create_edge arguments, in drawing order. The
+        # dicts of the payload are only created when iterating, so they can
+        # be serialized one by one
+        self.node_entities: List[Union[Device, Circuit, PowerPanel, PowerFeed]] = []
+        self.edge_specs: List[Dict] = []
+        self.nodes_devices: Dict[int, Device] = {}
+        self.nodes_circuits: Dict[int, Circuit] = {}
+        self.nodes_powerpanel: Dict[int, PowerPanel] = {}
+        self.nodes_powerfeed: Dict[int, PowerFeed] = {}
+        self.cable_ids: DefaultDict[int, Dict] = defaultdict(dict)
+        # undirected pairs of interface pks with a logical connection drawn
+        self.interface_pairs: Set[Tuple[int, int]] = set()
+        # saved coordinates and server side layout positions by node id
+        self.coordinates: Dict = {}
+        self.positions: Dict = {}
+
+    def add_edge(self, **kwargs):
+        self.edge_specs.append(kwargs)
+
+    def get_device_names(self, device_ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """Get device names, querying only for devices outside the queryset"""
+        device_names = {}
+        missing = set()
+        for device_id in device_ids:
+            if device_id is None:
+                continue
+            if device_id in self.devices:
+                device_names[device_id] = self.devices[device_id].name
+            else:
+                missing.add(device_id)
+
+        if missing:
+            device_names.update(
+                Device.objects.filter(pk__in=missing).values_list("pk", "name")
+            )
+        return device_names
+
+    def build(self) -> Optional[Dict]:
+        if not self.collect():
+            return None
+        with self.timings.stage("nodes"):
+            nodes = list(self.iter_nodes())
+        with self.timings.stage("edges"):
+            edges = list(self.iter_edges())
+        return {"nodes": nodes, "edges": edges}
+
+    def iter_nodes(self) -> Iterator[Dict]:
+        for entity in self.node_entities:
+            yield create_node(
+                entity,
+                self.save_coords,
+                self.role_image_urls,
+                self.lazy_tooltips,
+                self.positions.get(get_node_id(entity)),
+                self.coordinates.get(get_node_id(entity)),
+            )
+
+    def get_layout_positions(self) -> Dict:
+        """Lay out the nodes without saved coordinates
+
+        returns positions by node id, or nothing when there are fewer such
+        nodes than `layout_node_threshold` and the physics simulation in the
+        browser places them
+        """
+        unplaced = [
+            entity
+            for entity in self.node_entities
+            if get_node_id(entity) not in self.coordinates
+        ]
+        if self.layout_node_threshold is None or len(unplaced) < self.layout_node_threshold:
+            return {}
+
+        role_order = {
+            name: i
+            for i, name in enumerate(
+                settings.PLUGINS_CONFIG["netbox_topology_views"][
+                    "preselected_device_roles"
+                ]
+            )
+        }
+        return compute_layout(
+            ((get_node_id(entity), get_layout_tier(entity, role_order)) for entity in unplaced),
+            (
+                (spec["termination_a"]["device_id"], spec["termination_b"]["device_id"])
+                for spec in self.edge_specs
+            ),
+        )
+
+    def get_edge_ids(self) -> List[str]:
+        """Get the ids of the edges, numbering repeated keys of the same object"""
+        edge_ids = []
+        seen: DefaultDict[str, int] = defaultdict(int)
+        for spec in self.edge_specs:
+            key = get_edge_key(spec)
+            seen[key] += 1
+            edge_ids.append(key if seen[key] == 1 else f"{key}.{seen[key]}")
+        return edge_ids
+
+    def iter_edges(self) -> Iterator[Dict]:
+        for edge_id, kwargs in zip(self.get_edge_ids(), self.edge_specs):
+            yield create_edge(edge_id=edge_id, **kwargs)
+
+    def run_layer_query(self, name: str, load_layer: Callable[[], Tuple]) -> Tuple:
+        """Run the queries of a layer in a worker thread
+
+        every worker thread uses its own database connection, which is
+        closed like the connection of a request once it is too old
+        """
+        close_old_connections()
+        try:
+            with self.timings.stage(name):
+                return load_layer()
+        finally:
+            close_old_connections()
+
+    def load_devices(self) -> bool:
+        """Load the devices of the queryset, returns False if there are none"""
+        # the queryset is evaluated once into an index by id
+        self.devices = {d.pk: d for d in self.queryset}
+        if not self.devices:
+            return False
+
+        self.role_image_urls = get_role_image_urls()
+        self.device_ids = set(self.devices)
+        self.site_ids = {d.site_id for d in self.devices.values()}
+        return True
+
+    def collect(self) -> bool:
+        """Run the enabled layers, returns False if there are no devices"""
+        with self.timings.stage("devices"):
+            if not self.load_devices():
+                return False
+
+        layers = [
+            (name, load_layer, add_layer)
+            for name, enabled, load_layer, add_layer in (
+                ("circuit", self.show_circuit, self.load_circuits, self.add_circuits),
+                ("power", self.show_power, self.load_power, self.add_power),
+                (
+                    "logical",
+                    self.show_logical_connections,
+                    self.load_logical_connections,
+                    self.add_logical_connections,
+                ),
+                ("cables", self.show_cables, self.load_cables, self.add_cables),
+                ("wireless", self.show_wireless, self.load_wireless, self.add_wireless),
+            )
+            if enabled
+        ]
+
+        # the queries of the layers are independent and run concurrently,
+        # the results are added one layer after the other in a fixed order
+        if self.layer_workers > 1 and len(layers) > 1:
+            executor = get_layer_executor(self.layer_workers)
+            loaded = [
+                executor.submit(self.run_layer_query, name, load_layer)
+                for name, load_layer, _ in layers
+            ]
+            results = [future.result() for future in loaded]
+        else:
+            results = []
+            for name, load_layer, _ in layers:
+                with self.timings.stage(name):
+                    results.append(load_layer())
+
+        for (name, _, add_layer), result in zip(layers, results):
+            with self.timings.stage(name):
+                add_layer(*result)
+
+        for qs_device in self.devices.values():
+            if qs_device.pk not in self.nodes_devices and not self.hide_unconnected:
+                self.nodes_devices[qs_device.pk] = qs_device
+
+        self.node_entities.extend(self.nodes_devices.values())
+        with self.timings.stage("coordinates"):
+            saved = get_saved_coordinates(self.node_entities, self.layout)
+            self.coordinates = {
+                get_node_id(entity): saved[(type(entity), entity.pk)]
+                for entity in self.node_entities
+                if (type(entity), entity.pk) in saved
+            }
+        with self.timings.stage("layout"):
+            self.positions = self.get_layout_positions()
+
+        self.timings.counts["nodes"] = len(self.node_entities)
+        self.timings.counts["edges"] = len(self.edge_specs)
+        return True
+
+    def load_circuits(self):
+        """Load the circuit terminations cabled to the devices
+
+        without `hide_unconnected` the terminations at the sites of the devices
+        are loaded as well, so their circuits are drawn unconnected
+        """
+        circuit_termination_type = ContentType.objects.get_for_model(CircuitTermination)
+        filter = Q(
+            cable_id__in=CableTermination.objects.filter(
+                _device_id__in=self.device_ids,
+                cable__terminations__termination_type=circuit_termination_type,
+            ).values("cable_id")
+        )
+        if not self.hide_unconnected:
+            filter |= Q(site_id__in=self.site_ids)
+
+        circuit_terminations: List[CircuitTermination] = list(
+            CircuitTermination.objects.filter(filter).select_related(
+                "circuit__provider", "circuit__type"
+            )
+        )
+
+        cable_ends = get_cable_ends(
+            ct.cable_id for ct in circuit_terminations if ct.cable_id is not None
+        )
+        cables = Cable.objects.in_bulk(cable_ends.keys())
+        terminations = resolve_terminations(
+            ref for ends in cable_ends.values() for ref in ends.values()
+        )
+        device_names = self.get_device_names(
+            getattr(t, "device_id", None) for t in terminations.values()
+        )
+        return circuit_terminations, cable_ends, cables, terminations, device_names
+
+    def add_circuits(
+        self,
+        circuit_terminations: List[CircuitTermination],
+        cable_ends: Dict[int, Dict[str, TerminationRef]],
+        cables: Dict[int, Cable],
+        terminations: Dict[TerminationRef, Model],
+        device_names: Dict[int, str],
+    ):
+        for circuit_termination in circuit_terminations:
+            if (
+                not self.hide_unconnected
+                and circuit_termination.circuit_id not in self.nodes_circuits
+            ):
+                self.nodes_circuits[
+                    circuit_termination.circuit_id
+                ] = circuit_termination.circuit
+
+            ends = cable_ends.get(circuit_termination.cable_id)
+            if not ends:
+                continue
+
+            cable_a = terminations.get(ends.get("A"))
+            cable_b = terminations.get(ends.get("B"))
+            termination_a = create_circuit_termination(cable_a, device_names)
+            termination_b = create_circuit_termination(cable_b, device_names)
+            if not termination_a or not termination_b:
+                continue
+
+            self.add_edge(
+                cable=cables.get(circuit_termination.cable_id),
+                circuit={"provider_name": circuit_termination.circuit.provider.name},
+                termination_a=termination_a,
+                termination_b=termination_b,
+            )
+
+            circuit_has_connections = False
+            for termination in (cable_a, cable_b):
+                if isinstance(termination, CircuitTermination):
+                    continue
+                if termination.device_id in self.device_ids:
+                    circuit_has_connections = True
+                    if termination.device_id not in self.nodes_devices:
+                        self.nodes_devices[termination.device_id] = self.devices[
+                            termination.device_id
+                        ]
+
+            if circuit_has_connections and self.hide_unconnected:
+                if circuit_termination.circuit_id not in self.nodes_circuits:
+                    self.nodes_circuits[
+                        circuit_termination.circuit_id
+                    ] = circuit_termination.circuit
+
+        self.node_entities.extend(self.nodes_circuits.values())
+
+    def load_power(self):
+        if self.hide_unconnected:
+            return self.load_device_power()
+        return self.load_site_power()
+
+    def load_device_power(self):
+        """Load the power feeds cabled to the devices
+
+        the feeds are found from the device ends of their cables, so the cost
+        follows the amount of devices instead of the feeds at their sites.
+        Only feeds connected to the devices are drawn with `hide_unconnected`
+        """
+        power_feed_type = ContentType.objects.get_for_model(PowerFeed)
+        device_ends = (
+            CableTermination.objects.filter(
+                _device_id__in=self.device_ids,
+                cable__terminations__termination_type=power_feed_type,
+            )
+            .order_by("-pk")
+            .values_list(
+                "cable__terminations__termination_id",
+                "termination_type_id",
+                "termination_id",
+            )
+        )
+        # the first device end of every feed cable wins, like `link_peers[0]`
+        peer_refs = {
+            power_feed_id: (content_type_id, object_id)
+            for power_feed_id, content_type_id, object_id in device_ends
+        }
+        power_feeds: List[PowerFeed] = list(
+            PowerFeed.objects.filter(pk__in=peer_refs.keys()).select_related(
+                "power_panel__site", "power_panel__location"
+            )
+        )
+        terminations = resolve_terminations(peer_refs.values())
+        link_peers = {pk: terminations.get(ref) for pk, ref in peer_refs.items()}
+        return power_feeds, link_peers
+
+    def load_site_power(self):
+        """Load every power feed of the panels at the sites of the devices
+
+        the unconnected feeds are drawn as well, so no link peers are needed
+        """
+        power_feeds: List[PowerFeed] = list(
+            PowerFeed.objects.filter(
+                power_panel__site_id__in=self.site_ids
+            ).select_related("power_panel__site", "power_panel__location")
+        )
+        return power_feeds, {}
+
+    def add_power(self, power_feeds: List[PowerFeed], link_peers: Dict[int, Model]):
+        for power_feed in power_feeds:
+            if self.hide_unconnected and power_feed.cable_id is None:
+                continue
+
+            if power_feed.power_panel_id not in self.nodes_powerpanel:
+                self.nodes_powerpanel[power_feed.power_panel_id] = power_feed.power_panel
+
+            power_link_name = ""
+            if power_feed.pk not in self.nodes_powerfeed:
+                if self.hide_unconnected:
+                    link_peer = link_peers.get(power_feed.pk)
+                    if getattr(link_peer, "device_id", None) in self.device_ids:
+                        self.nodes_powerfeed[power_feed.pk] = power_feed
+                        power_link_name = link_peer.name
+                else:
+                    self.nodes_powerfeed[power_feed.pk] = power_feed
+
+            termination_a = {
+                "termination_name": power_feed.power_panel.name,
+                "termination_device_name": "",
+                "device_id": f"p{power_feed.power_panel_id}",
+            }
+            termination_b = {
+                "termination_name": power_feed.name,
+                "termination_device_name": power_link_name,
+                "device_id": f"f{power_feed.pk}",
+            }
+            self.add_edge(
+                termination_a=termination_a,
+                termination_b=termination_b,
+                power=True,
+            )
+
+            if power_feed.cable_id is not None:
+                self.cable_ids[power_feed.cable_id][power_feed.cable_end] = termination_b
+
+        self.node_entities.extend(self.nodes_powerfeed.values())
+        self.node_entities.extend(self.nodes_powerpanel.values())
+
+    def load_table_edges(self, kind: str) -> List[TopologyEdge]:
+        return list(
+            TopologyEdge.objects.filter(
+                kind=kind,
+                from_device_id__in=self.device_ids,
+                to_device_id__in=self.device_ids,
+            ).order_by("object_id", "pk")
+        )
+
+    def load_logical_connections(self):
+        """Load the logical connections of the devices
+
+        with the `adjacency_table` enabled the interfaces and destinations are
+        unsaved instances built from the `TopologyEdge` rows
+        """
+        if not self.adjacency_table:
+            interfaces: List[Interface] = list(
+                Interface.objects.filter(
+                    Q(_path__is_complete=True) & Q(device_id__in=self.device_ids)
+                ).select_related("_path")
+            )
+            return (interfaces, *get_path_destinations(interfaces))
+
+        origins: Dict[int, Interface] = {}
+        interface_destinations: DefaultDict[int, List[TerminationRef]] = defaultdict(list)
+        destinations: Dict[TerminationRef, Model] = {}
+        for edge in self.load_table_edges(TopologyEdge.KIND_INTERFACE):
+            origins.setdefault(
+                edge.object_id,
+                Interface(
+                    pk=edge.object_id,
+                    name=edge.from_name,
+                    device_id=edge.from_device_id,
+                    cable_id=edge.from_cable_id,
+                ),
+            )
+            ref = (edge.to_termination_type_id, edge.to_termination_id)
+            interface_destinations[edge.object_id].append(ref)
+            destinations[ref] = Interface(
+                pk=edge.to_termination_id,
+                name=edge.to_name,
+                device_id=edge.to_device_id,
+                cable_id=edge.to_cable_id,
+            )
+        return list(origins.values()), interface_destinations, destinations
+
+    def add_logical_connections(
+        self,
+        interfaces: List[Interface],
+        interface_destinations: Dict[int, List[TerminationRef]],
+        destinations: Dict[TerminationRef, Model],
+    ):
+        for interface in interfaces:
+            for ref in interface_destinations.get(interface.pk, []):
+                destination = destinations.get(ref)
+                if not isinstance(destination, Interface):
+                    continue
+
+                if destination.device_id not in self.device_ids:
+                    continue
+
+                pair = (
+                    (interface.pk, destination.pk)
+                    if interface.pk < destination.pk
+                    else (destination.pk, interface.pk)
+                )
+                if pair in self.interface_pairs:
+                    # we've already captured the connection from the other end, ignore it
+                    continue
+
+                if (
+                    self.hide_single_cable_logical_conns
+                    and interface.cable_id == destination.cable_id
+                    and self.show_cables
+                ):
+                    # interface connection is the same as the cable connection, ignore this connection
+                    continue
+
+                self.interface_pairs.add(pair)
+                device = self.devices[interface.device_id]
+                destination_device = self.devices[destination.device_id]
+                termination_a = {
+                    "termination_name": interface.name,
+                    "termination_device_name": device.name,
+                    "device_id": device.pk,
+                }
+                termination_b = {
+                    "termination_name": destination.name,
+                    "termination_device_name": destination_device.name,
+                    "device_id": destination_device.pk,
+                }
+                self.add_edge(
+                    termination_a=termination_a,
+                    termination_b=termination_b,
+                    interface=interface,
+                )
+                self.nodes_devices[device.pk] = device
+                self.nodes_devices[destination_device.pk] = destination_device
+
+    def is_drawn_termination_type(self, content_type_id: int) -> bool:
+        return is_drawn_termination_type(content_type_id, self.ignore_cable_type)
+
+    def load_cables(self):
+        """Load the cables between the devices
+
+        both ends of the cables are fetched with `get_cable_pairs`, or from the
+        `TopologyEdge` rows with the `adjacency_table` enabled. A cable with
+        several terminations on an end gets one edge per B termination, drawn
+        to the last A termination
+        """
+        cables: Dict[int, Cable] = {}
+        termination_names: Dict[TerminationRef, str] = {}
+        if self.adjacency_table:
+            cable_pairs = []
+            for edge in self.load_table_edges(TopologyEdge.KIND_CABLE):
+                from_ref = (edge.from_termination_type_id, edge.from_termination_id)
+                to_ref = (edge.to_termination_type_id, edge.to_termination_id)
+                cable_pairs.append(
+                    (
+                        edge.object_id,
+                        edge.to_termination_id,
+                        *from_ref,
+                        edge.from_device_id,
+                        *to_ref,
+                        edge.to_device_id,
+                    )
+                )
+                cables[edge.object_id] = Cable(pk=edge.object_id, color=edge.color)
+                termination_names[from_ref] = edge.from_name
+                termination_names[to_ref] = edge.to_name
+        else:
+            cable_pairs = get_cable_pairs(
+                Q(
+                    _device_id__in=self.device_ids,
+                    cable__terminations___device_id__in=self.device_ids,
+                )
+            )
+
+        pairs: Dict[Tuple[int, int], Tuple] = {}
+        for cable_id, pk, *ends in cable_pairs:
+            if self.is_drawn_termination_type(ends[0]) and self.is_drawn_termination_type(
+                ends[3]
+            ):
+                pairs[(cable_id, pk)] = tuple(ends)
+
+        # the device ends of power cables are drawn to the power feeds
+        power_ends = []
+        if self.show_power:
+            power_feed_type = ContentType.objects.get_for_model(PowerFeed)
+            power_ends = [
+                (cable_id, cable_end, (content_type_id, object_id), device_id)
+                for cable_id, cable_end, content_type_id, object_id, device_id in (
+                    CableTermination.objects.filter(
+                        _device_id__in=self.device_ids,
+                        cable__terminations__termination_type=power_feed_type,
+                    )
+                    .order_by("cable_id", "cable_end", "pk")
+                    .values_list(
+                        "cable_id",
+                        "cable_end",
+                        "termination_type_id",
+                        "termination_id",
+                        "_device_id",
+                    )
+                )
+                if self.is_drawn_termination_type(content_type_id)
+            ]
+
+        cables.update(
+            Cable.objects.only("pk", "color").in_bulk(
+                ({cable_id for cable_id, _ in pairs} | {end[0] for end in power_ends})
+                - cables.keys()
+            )
+        )
+        termination_names.update(
+            get_termination_names(
+                ref
+                for ref in (
+                    [(a_type, a_id) for a_type, a_id, _, _, _, _ in pairs.values()]
+                    + [(b_type, b_id) for _, _, _, b_type, b_id, _ in pairs.values()]
+                    + [ref for _, _, ref, _ in power_ends]
+                )
+                if ref not in termination_names
+            )
+        )
+        return pairs, power_ends, cables, termination_names
+
+    def add_cables(
+        self,
+        pairs: Dict[Tuple[int, int], Tuple],
+        power_ends: List[Tuple[int, str, TerminationRef, int]],
+        cables: Dict[int, Cable],
+        termination_names: Dict[TerminationRef, str],
+    ):
+        """Add the cables between the devices
+
+        device ends of power cables are drawn to the power feeds added by
+        `add_power`
+        """
+
+        def device_termination(ref: TerminationRef, device_id: int):
+            if device_id not in self.nodes_devices:
+                self.nodes_devices[device_id] = self.devices[device_id]
+            return {
+                "termination_name": termination_names.get(ref),
+                "termination_device_name": self.devices[device_id].name,
+                "device_id": device_id,
+            }
+
+        for cable_id, cable_end, ref, device_id in power_ends:
+            feed_end = "B" if cable_end == "A" else "A"
+            if feed_end not in self.cable_ids.get(cable_id, {}):
+                continue
+            ends = {
+                cable_end: device_termination(ref, device_id),
+                feed_end: self.cable_ids[cable_id][feed_end],
+            }
+            self.add_edge(
+                cable=cables.get(cable_id),
+                termination_a=ends["A"],
+                termination_b=ends["B"],
+            )
+
+        for (cable_id, _), ends in pairs.items():
+            a_type, a_id, a_device_id, b_type, b_id, b_device_id = ends
+            self.add_edge(
+                cable=cables.get(cable_id),
+                termination_a=device_termination((a_type, a_id), a_device_id),
+                termination_b=device_termination((b_type, b_id), b_device_id),
+            )
+
+    def load_wireless(self):
+        if not self.adjacency_table:
+            return (
+                list(
+                    WirelessLink.objects.filter(
+                        Q(_interface_a_device_id__in=self.device_ids)
+                        & Q(_interface_b_device_id__in=self.device_ids)
+                    ).select_related("interface_a", "interface_b")
+                ),
+            )
+
+        wlan_links = []
+        for edge in self.load_table_edges(TopologyEdge.KIND_WIRELESS):
+            wlan_link = WirelessLink(pk=edge.object_id)
+            wlan_link.interface_a = Interface(
+                pk=edge.from_termination_id,
+                name=edge.from_name,
+                device_id=edge.from_device_id,
+            )
+            wlan_link.interface_b = Interface(
+                pk=edge.to_termination_id, name=edge.to_name, device_id=edge.to_device_id
+            )
+            wlan_links.append(wlan_link)
+        return (wlan_links,)
+
+    def add_wireless(self, wlan_links: List[WirelessLink]):
+        for wlan_link in wlan_links:
+            device_a = self.devices[wlan_link.interface_a.device_id]
+            device_b = self.devices[wlan_link.interface_b.device_id]
+            if device_a.pk not in self.nodes_devices:
+                self.nodes_devices[device_a.pk] = device_a
+            if device_b.pk not in self.nodes_devices:
+                self.nodes_devices[device_b.pk] = device_b
+
+            termination_a = {
+                "termination_name": wlan_link.interface_a.name,
+                "termination_device_name": device_a.name,
+                "device_id": device_a.pk,
+            }
+            termination_b = {
+                "termination_name": wlan_link.interface_b.name,
+                "termination_device_name": device_b.name,
+                "device_id": device_b.pk,
+            }
+            self.add_edge(
+                cable=wlan_link,
+                termination_a=termination_a,
+                termination_b=termination_b,
+                wireless={"ssid": wlan_link.ssid},
+            )
+
+
+def get_topology_data(
+    queryset: QuerySet,
+    hide_unconnected: bool,
+    save_coords: bool,
+    show_cables: bool,
+    show_circuit: bool,
+    show_logical_connections: bool,
+    show_power: bool,
+    show_wireless: bool,
+    lazy_tooltips: bool = False,
+    timings: Optional[TopologyTimings] = None,
+    layout: str = "",
+):
+    return TopologyBuilder(
+        queryset,
+        hide_unconnected,
+        save_coords,
+        show_cables,
+        show_circuit,
+        show_logical_connections,
+        show_power,
+        show_wireless,
+        lazy_tooltips,
+        timings,
+        layout,
+    ).build()
+
+
+def iter_topology_json(
+    nodes: Iterable[Dict], edges: Iterable[Dict], chunk_size: int = 500
+) -> Iterator[str]:
+    """Serialize a topology incrementally
+
+    yields the JSON document in chunks of `chunk_size` nodes or edges, so the
+    full document never has to be held in memory
+    """
+    for key, items in (("nodes", iter(nodes)), ("edges", iter(edges))):
+        yield '{"nodes": [' if key == "nodes" else '], "edges": ['
+        separator = ""
+        while chunk := list(islice(items, chunk_size)):
+            yield separator + ", ".join(json.dumps(item) for item in chunk)
+            separator = ", "
+    yield "]}"
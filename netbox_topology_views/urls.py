@@ -8,5 +8,10 @@ from . import views
 urlpatterns = (
     path("", RedirectView.as_view(url="topology/", permanent=True)),
     path("topology/", views.TopologyHomeView.as_view(), name="home"),
+    path(
+        "topology/saved/<int:pk>/",
+        views.SavedTopologyHomeView.as_view(),
+        name="saved_view",
+    ),
     path("images/", views.TopologyImagesView.as_view(), name="images"),
 )
@@ -1,9 +1,9 @@
 from dataclasses import dataclass
-from functools import lru_cache
 from pathlib import Path
-from typing import Type
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
 
 import sys
+import time
 
 from django.conf import settings
 from django.db.models import Model
@@ -61,29 +61,94 @@ IMAGE_FILETYPES = (
 )
 
 
-def find_image_in_dir(glob: str, dir: Path):
-    return next(
-        (f for f in dir.glob(f"{glob}.*") if f.suffix.lstrip(".") in IMAGE_FILETYPES),
-        None,
-    )
+class ImageIndex:
+    """Index of the image files of a directory
 
+    the directory is listed once and listed again when its modification time
+    changes, which happens whenever a file is added, removed or renamed. The
+    modification time is checked at most every `check_interval` seconds
+    """
 
-@lru_cache(maxsize=50)
-def find_image_url(glob: str, dir: Path = CONF_IMAGE_DIR):
+    def __init__(self, dir: Path, check_interval: float = 1.0):
+        self.dir = dir
+        self.check_interval = check_interval
+        self.checked: Optional[float] = None
+        self.mtime: Optional[int] = None
+        # image urls by stem, the first file in name order wins
+        self.urls: Dict[str, str] = {}
+        self.names: FrozenSet[str] = frozenset()
+        self.images: List[Tuple[str, str]] = []
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < self.check_interval:
+            return
+        self.checked = now
+
+        try:
+            mtime = self.dir.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return
+
+        files = []
+        if mtime is not None:
+            files = sorted(
+                f
+                for f in self.dir.iterdir()
+                if f.is_file() and f.suffix.lstrip(".") in IMAGE_FILETYPES
+            )
+
+        urls: Dict[str, str] = {}
+        images = []
+        for f in files:
+            url = image_static_url(f)
+            urls.setdefault(f.stem, url)
+            images.append((f.stem, url))
+
+        # replaced at once, concurrent readers see either index
+        self.urls, self.names, self.images = urls, frozenset(f.name for f in files), images
+        self.mtime = mtime
+
+    def get_url(self, stem: str) -> Optional[str]:
+        self.refresh()
+        return self.urls.get(stem)
+
+    def has_file(self, name: str) -> bool:
+        self.refresh()
+        return name in self.names
+
+    def get_images(self) -> List[Tuple[str, str]]:
+        """Get the stem and url of every image"""
+        self.refresh()
+        return self.images
+
+
+_image_indexes: Dict[Path, ImageIndex] = {}
+
+
+def get_image_index(dir: Path = CONF_IMAGE_DIR) -> ImageIndex:
+    if dir not in _image_indexes:
+        _image_indexes[dir] = ImageIndex(dir)
+    return _image_indexes[dir]
+
+
+def find_image_url(stem: str, dir: Path = CONF_IMAGE_DIR):
     """
-    will attempt to find a file that matches glob in given directory with any file extension,
+    will attempt to find an image named stem in given directory with any file extension,
     otherwise will try to find a `role-unknown` image
 
     returns static file url
     """
-    if file := find_image_in_dir(glob, dir):
-        return image_static_url(file)
+    if url := get_image_index(dir).get_url(stem):
+        return url
 
-    if glob != "role-unknown" and (file := find_image_in_dir("role-unknown", dir)):
-        return image_static_url(file)
+    if stem != "role-unknown" and (url := get_image_index(dir).get_url("role-unknown")):
+        return url
 
-    if dir != IMAGE_DIR and (file := find_image_in_dir("role-unknown", IMAGE_DIR)):
-        return image_static_url(file)
+    if dir != IMAGE_DIR and (url := get_image_index(IMAGE_DIR).get_url("role-unknown")):
+        return url
 
     return ""
 